@@ -1,15 +1,19 @@
-from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, Depends, Query, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from fastapi.responses import FileResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, ORJSONResponse, Response, StreamingResponse
+import asyncio
 import os
 import shutil
 from datetime import datetime, timedelta
-from typing import List, Optional
-from database import execute_query, execute_one, execute_insert, execute_update
+from typing import List, Optional, Union
+from urllib.parse import quote
+from cachetools import TTLCache
+from database import aquery, aone, ainsert, areturning, in_clause_query, decode_json, IS_PRODUCTION
 from models import (
-    Initiative, InitiativeCreate, InitiativeUpdate,
+    INITIATIVE_COLUMNS, INITIATIVE_SELECT,
+    Initiative, InitiativeCreate, InitiativeUpdate, InitiativeWithDocuments,
     Document, DocumentCreate, DocumentUpdate,
     DocumentTemplate, DocumentTemplateCreate,
     DocumentRequirement, ComplianceStatus,
@@ -25,28 +29,53 @@ from chat import (
     validate_claude_api_key, store_user_api_key, get_user_api_key,
     delete_user_api_key, process_chat_query
 )
+from queries import (
+    LIST_INITIATIVES_SQL, CHAT_CONTEXT_SQL, EXPORT_INITIATIVES_SQL,
+    EXPORT_INITIATIVES_AFTER_SQL, update_initiative_sql,
+    get_stage_requirements, get_uploaded_required
+)
+from web import lifespan, RowsResponse, SPAStaticFiles, stream_upload
 
-app = FastAPI(title="AI Initiatives Inventory API", version="1.0.0")
-
-# CORS configuration
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+app = FastAPI(
+    title="AI Initiatives Inventory API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# CORS configuration. Production serves the SPA from this app, so only the
+# Vite dev server needs cross-origin access by default; with no origins the
+# middleware is skipped
+DEV_CORS_ORIGINS = "" if IS_PRODUCTION else "http://localhost:5173,http://127.0.0.1:5173"
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("CORS_ORIGINS", DEV_CORS_ORIGINS).split(",")
+    if origin.strip()
+]
+
+if CORS_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=CORS_ORIGINS,
+        allow_credentials=True,
+        allow_methods=["GET", "POST", "PUT", "DELETE"],
+        allow_headers=["Authorization", "Content-Type"],
+        max_age=86400,
+    )
+
 # File upload configuration
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "uploads")
+UPLOAD_DIR = doc_mgr.UPLOAD_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+
+# When set (e.g. "/protected_uploads/"), downloads are handed to a fronting
+# nginx via X-Accel-Redirect so it can sendfile() them from an internal location
+X_ACCEL_REDIRECT_PREFIX = os.getenv("X_ACCEL_REDIRECT_PREFIX")
 
 # Authentication endpoints
 @app.post("/api/auth/login", response_model=Token)
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     """Login endpoint that returns JWT token"""
-    user = authenticate_user(form_data.username, form_data.password)
+    user = await asyncio.to_thread(authenticate_user, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -77,12 +106,13 @@ async def create_initiative(
     current_user = Depends(get_current_active_user)
 ):
     """Create a new initiative"""
-    query = """
+    query = f"""
         INSERT INTO initiatives (
             name, description, department, stage, priority,
             lead_name, lead_email, business_value, technical_approach,
             start_date, end_date, status
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        RETURNING {INITIATIVE_SELECT}
     """
     params = (
         initiative.name, initiative.description, initiative.department,
@@ -92,13 +122,14 @@ async def create_initiative(
         initiative.end_date, initiative.status
     )
     
-    initiative_id = execute_insert(query, params)
-    
-    # Fetch and return the created initiative
-    result = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
+    result = await areturning(query, params)
     return dict(result)
 
-@app.get("/api/initiatives", response_model=List[Initiative])
+# Only ?include=documents adds the documents key to each initiative
+@app.get(
+    "/api/initiatives",
+    response_model=Union[List[InitiativeWithDocuments], List[Initiative]]
+)
 async def list_initiatives(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
@@ -108,34 +139,36 @@ async def list_initiatives(
     status: Optional[str] = Query("active"),
     sort_by: Optional[str] = Query("created_at", regex="^(created_at|updated_at|priority|name)$"),
     sort_order: Optional[str] = Query("desc", regex="^(asc|desc)$"),
+    include: Optional[str] = Query(None, regex="^documents$"),
     current_user = Depends(get_current_active_user)
 ):
     """List initiatives with filtering, sorting, and pagination"""
-    query = "SELECT * FROM initiatives WHERE 1=1"
-    params = []
-    
-    # Apply filters
-    if department:
-        query += " AND department = ?"
-        params.append(department)
-    if stage:
-        query += " AND stage = ?"
-        params.append(stage)
-    if priority:
-        query += " AND priority = ?"
-        params.append(priority)
-    if status:
-        query += " AND status = ?"
-        params.append(status)
-    
-    # Apply sorting
-    query += f" ORDER BY {sort_by} {sort_order.upper()}"
-    
-    # Apply pagination
-    query += f" LIMIT {limit} OFFSET {skip}"
-    
-    results = execute_query(query, tuple(params) if params else None)
-    return [dict(row) for row in results]
+    filters = (department, stage, priority, status)
+    with_documents = include == "documents"
+    query = LIST_INITIATIVES_SQL[
+        tuple(bool(value) for value in filters) + (sort_by, sort_order, with_documents)
+    ]
+    params = [value for value in filters if value]
+    params.extend([limit, skip])
+    
+    results = await aquery(query, tuple(params))
+    if not results:
+        return []
+    columns = tuple(results[0].keys())
+    initiatives = [dict(zip(columns, row)) for row in results]
+    if with_documents:
+        for initiative in initiatives:
+            initiative["documents"] = decode_json(initiative["documents"])
+    return initiatives
+
+async def require_initiative(initiative_id: int):
+    """Raise 404 unless a live initiative with this id exists"""
+    exists = await aone(
+        "SELECT 1 FROM initiatives WHERE id = ? AND status != 'deleted'",
+        (initiative_id,)
+    )
+    if not exists:
+        raise HTTPException(status_code=404, detail="Initiative not found")
 
 @app.get("/api/initiatives/{initiative_id}", response_model=Initiative)
 async def get_initiative(
@@ -143,7 +176,7 @@ async def get_initiative(
     current_user = Depends(get_current_active_user)
 ):
     """Get a single initiative by ID"""
-    result = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
+    result = await aone(f"SELECT {INITIATIVE_SELECT} FROM initiatives WHERE id = ?", (initiative_id,))
     if not result:
         raise HTTPException(status_code=404, detail="Initiative not found")
     return dict(result)
@@ -155,30 +188,23 @@ async def update_initiative(
     current_user = Depends(get_current_active_user)
 ):
     """Update an initiative"""
-    # Check if initiative exists
-    existing = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Initiative not found")
-    
-    # Build update query dynamically
-    update_fields = []
-    params = []
-    
-    for field, value in initiative.dict(exclude_unset=True).items():
-        if value is not None:
-            update_fields.append(f"{field} = ?")
-            params.append(value)
+    # Skip form-only fields that have no backing column
+    fields = {
+        field: value for field, value in initiative.dict(exclude_unset=True).items()
+        if value is not None and field in INITIATIVE_COLUMNS
+    }
     
-    if update_fields:
-        update_fields.append("updated_at = ?")
-        params.append(datetime.utcnow())
+    if fields:
+        # Single round trip: a missing row simply returns nothing
+        columns = frozenset(fields)
+        params = [fields[column] for column in sorted(columns)]
         params.append(initiative_id)
-        
-        query = f"UPDATE initiatives SET {', '.join(update_fields)} WHERE id = ?"
-        execute_update(query, tuple(params))
+        result = await areturning(update_initiative_sql(columns), tuple(params))
+    else:
+        result = await aone(f"SELECT {INITIATIVE_SELECT} FROM initiatives WHERE id = ?", (initiative_id,))
     
-    # Return updated initiative
-    result = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
+    if not result:
+        raise HTTPException(status_code=404, detail="Initiative not found")
     return dict(result)
 
 @app.delete("/api/initiatives/{initiative_id}")
@@ -187,16 +213,14 @@ async def delete_initiative(
     current_user = Depends(require_role("admin"))
 ):
     """Soft delete an initiative (admin only)"""
-    # Check if initiative exists
-    existing = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
-    if not existing:
-        raise HTTPException(status_code=404, detail="Initiative not found")
-    
     # Soft delete by setting status to 'deleted'
-    execute_update(
-        "UPDATE initiatives SET status = 'deleted', updated_at = ? WHERE id = ?",
-        (datetime.utcnow(), initiative_id)
+    deleted = await areturning(
+        "UPDATE initiatives SET status = 'deleted', updated_at = CURRENT_TIMESTAMP "
+        "WHERE id = ? AND status != 'deleted' RETURNING id",
+        (initiative_id,)
     )
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Initiative not found")
     
     return {"message": "Initiative deleted successfully"}
 
@@ -210,30 +234,20 @@ async def upload_document(
 ):
     """Upload a document for an initiative"""
     # Check if initiative exists
-    initiative = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
-    if not initiative:
-        raise HTTPException(status_code=404, detail="Initiative not found")
-    
-    # Check file size
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large")
+    await require_initiative(initiative_id)
     
     # Save file
-    filename = f"{initiative_id}_{datetime.utcnow().timestamp()}_{file.filename}"
-    file_path = os.path.join(UPLOAD_DIR, filename)
-    
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    filename = f"{initiative_id}_{doc_mgr.stored_filename(file.filename)}"
+    size = await stream_upload(file, os.path.join(UPLOAD_DIR, filename))
     
     # Save to database
-    doc_id = execute_insert(
+    doc_id = await ainsert(
         """INSERT INTO documents (
             initiative_id, filename, file_path, file_size, 
             uploaded_by, document_type
         ) VALUES (?, ?, ?, ?, ?, ?)""",
         (
-            initiative_id, file.filename, filename, len(contents),
+            initiative_id, file.filename, filename, size,
             current_user["username"], document_type
         )
     )
@@ -241,29 +255,46 @@ async def upload_document(
     return {
         "id": doc_id,
         "filename": file.filename,
-        "size": len(contents),
+        "size": size,
         "message": "Document uploaded successfully"
     }
 
+# Stat results for documents recently confirmed present on disk
+_document_stat_cache = TTLCache(maxsize=2048, ttl=60)
+
 @app.get("/api/documents/{document_id}")
 async def download_document(
     document_id: int,
+    request: Request,
     current_user = Depends(get_current_active_user)
 ):
     """Download a document"""
-    document = execute_one("SELECT * FROM documents WHERE id = ?", (document_id,))
+    document = await aone("SELECT filename, file_path FROM documents WHERE id = ?", (document_id,))
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
+    if X_ACCEL_REDIRECT_PREFIX:
+        return Response(headers={
+            "X-Accel-Redirect": X_ACCEL_REDIRECT_PREFIX + quote(document["file_path"]),
+            "Content-Disposition": f"attachment; filename*=utf-8''{quote(document['filename'])}"
+        })
+    
     file_path = os.path.join(UPLOAD_DIR, document["file_path"])
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="File not found on disk")
     
-    return FileResponse(
-        file_path,
-        filename=document["filename"],
-        media_type="application/octet-stream"
-    )
+    # Stored files are never rewritten, so a recent stat can be reused
+    stat_result = _document_stat_cache.get(document_id)
+    if stat_result is None:
+        try:
+            stat_result = await run_in_threadpool(os.stat, file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found on disk")
+        _document_stat_cache[document_id] = stat_result
+    
+    # Media type is guessed from the filename extension
+    response = FileResponse(file_path, filename=document["filename"], stat_result=stat_result)
+    if request.headers.get("if-none-match") == response.headers["etag"]:
+        return Response(status_code=304, headers={"etag": response.headers["etag"]})
+    return response
 
 @app.get("/api/initiatives/{initiative_id}/documents", response_model=List[Document])
 async def list_initiative_documents(
@@ -281,7 +312,7 @@ async def list_initiative_documents(
     
     query += " ORDER BY uploaded_at DESC"
     
-    documents = execute_query(query, tuple(params))
+    documents = await aquery(query, tuple(params))
     return [dict(doc) for doc in documents]
 
 # Admin Document Management endpoints
@@ -295,23 +326,19 @@ async def upload_admin_document(
     current_user = Depends(require_role("admin"))
 ):
     """Upload a document to the admin library (admin only)"""
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large")
-    
     # Save file using document manager
-    relative_path = doc_mgr.save_document_file(
-        contents, file.filename, "admin", category
-    )
+    file_path = doc_mgr.new_document_path(file.filename, "admin", category)
+    size = await stream_upload(file, file_path)
+    relative_path = os.path.relpath(file_path, doc_mgr.UPLOAD_DIR)
     
     # Save to database
-    doc_id = execute_insert(
+    doc_id = await ainsert(
         """INSERT INTO documents (
             filename, file_path, file_size, uploaded_by, 
             library_type, category, description, tags, is_template
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (
-            file.filename, relative_path, len(contents),
+            file.filename, relative_path, size,
             current_user["username"], "admin", category,
             description, tags, is_template
         )
@@ -339,8 +366,8 @@ async def list_admin_documents(
     
     query += " ORDER BY uploaded_at DESC"
     
-    documents = execute_query(query, tuple(params) if params else None)
-    return [dict(doc) for doc in documents]
+    documents = await aquery(query, tuple(params) if params else None)
+    return RowsResponse(documents)
 
 # Initiative Core Documents endpoints
 @app.post("/api/initiatives/{initiative_id}/documents/core")
@@ -355,27 +382,21 @@ async def upload_core_document(
 ):
     """Upload a core governance document for an initiative"""
     # Check if initiative exists
-    initiative = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
-    if not initiative:
-        raise HTTPException(status_code=404, detail="Initiative not found")
-    
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large")
+    await require_initiative(initiative_id)
     
     # Save file
-    relative_path = doc_mgr.save_document_file(
-        contents, file.filename, "core", None, initiative_id, is_required
-    )
+    file_path = doc_mgr.new_document_path(file.filename, "core", None, initiative_id, is_required)
+    size = await stream_upload(file, file_path)
+    relative_path = os.path.relpath(file_path, doc_mgr.UPLOAD_DIR)
     
     # Save to database
-    doc_id = execute_insert(
+    doc_id = await ainsert(
         """INSERT INTO documents (
             initiative_id, filename, file_path, file_size, uploaded_by,
             library_type, document_type, is_required, description, tags
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (
-            initiative_id, file.filename, relative_path, len(contents),
+            initiative_id, file.filename, relative_path, size,
             current_user["username"], "core", document_type,
             is_required, description, tags
         )
@@ -400,27 +421,21 @@ async def upload_ancillary_document(
 ):
     """Upload an ancillary document for an initiative"""
     # Check if initiative exists
-    initiative = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
-    if not initiative:
-        raise HTTPException(status_code=404, detail="Initiative not found")
-    
-    contents = await file.read()
-    if len(contents) > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File too large")
+    await require_initiative(initiative_id)
     
     # Save file
-    relative_path = doc_mgr.save_document_file(
-        contents, file.filename, "ancillary", None, initiative_id
-    )
+    file_path = doc_mgr.new_document_path(file.filename, "ancillary", None, initiative_id)
+    size = await stream_upload(file, file_path)
+    relative_path = os.path.relpath(file_path, doc_mgr.UPLOAD_DIR)
     
     # Save to database
-    doc_id = execute_insert(
+    doc_id = await ainsert(
         """INSERT INTO documents (
             initiative_id, filename, file_path, file_size, uploaded_by,
             library_type, document_type, description, tags
         ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
         (
-            initiative_id, file.filename, relative_path, len(contents),
+            initiative_id, file.filename, relative_path, size,
             current_user["username"], "ancillary", document_type,
             description, tags
         )
@@ -446,17 +461,13 @@ async def create_document_template(
     file_path = None
     
     if file:
-        contents = await file.read()
-        if len(contents) > MAX_FILE_SIZE:
-            raise HTTPException(status_code=413, detail="File too large")
-        
         # Save template file
-        file_path = doc_mgr.save_document_file(
-            contents, file.filename, "admin", "template"
-        )
+        template_path = doc_mgr.new_document_path(file.filename, "admin", "template")
+        await stream_upload(file, template_path)
+        file_path = os.path.relpath(template_path, doc_mgr.UPLOAD_DIR)
     
     # Save to database
-    template_id = execute_insert(
+    template_id = await ainsert(
         """INSERT INTO document_templates (
             name, description, category, file_path, placeholders, created_by
         ) VALUES (?, ?, ?, ?, ?, ?)""",
@@ -487,8 +498,8 @@ async def list_document_templates(
     
     query += " ORDER BY created_at DESC"
     
-    templates = execute_query(query, tuple(params) if params else None)
-    return [dict(template) for template in templates]
+    templates = await aquery(query, tuple(params) if params else None)
+    return RowsResponse(templates)
 
 @app.post("/api/initiatives/{initiative_id}/templates/{template_id}/instantiate")
 async def instantiate_template(
@@ -500,12 +511,10 @@ async def instantiate_template(
 ):
     """Create a document from a template for an initiative"""
     # Check if initiative exists
-    initiative = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
-    if not initiative:
-        raise HTTPException(status_code=404, detail="Initiative not found")
+    await require_initiative(initiative_id)
     
     # Get template
-    template = execute_one(
+    template = await aone(
         "SELECT * FROM document_templates WHERE id = ? AND is_active = 1",
         (template_id,)
     )
@@ -515,12 +524,12 @@ async def instantiate_template(
     # Copy template file if it exists
     relative_path = None
     if template["file_path"]:
-        relative_path = doc_mgr.copy_template_file(
-            template["file_path"], initiative_id, document_name, is_required
+        relative_path = await run_in_threadpool(
+            doc_mgr.copy_template_file, template["file_path"], initiative_id, document_name, is_required
         )
     
     # Create document record
-    doc_id = execute_insert(
+    doc_id = await ainsert(
         """INSERT INTO documents (
             initiative_id, filename, file_path, uploaded_by,
             library_type, is_required, template_id, description
@@ -540,6 +549,7 @@ async def instantiate_template(
     }
 
 # Compliance tracking endpoints
+
 @app.get("/api/initiatives/{initiative_id}/compliance", response_model=ComplianceStatus)
 async def check_compliance_status(
     initiative_id: int,
@@ -547,30 +557,19 @@ async def check_compliance_status(
 ):
     """Check document compliance status for an initiative"""
     # Get all required documents for the initiative's stage
-    initiative = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
+    initiative = await aone("SELECT stage FROM initiatives WHERE id = ?", (initiative_id,))
     if not initiative:
         raise HTTPException(status_code=404, detail="Initiative not found")
     
-    # Get required documents based on stage
-    required_docs = execute_query(
-        """SELECT * FROM document_requirements 
-           WHERE is_mandatory = 1 AND (stage = ? OR stage IS NULL)""",
-        (initiative["stage"],)
-    )
-    
-    # Get uploaded required documents
-    uploaded_docs = execute_query(
-        """SELECT * FROM documents 
-           WHERE initiative_id = ? AND library_type = 'core' 
-           AND is_required = 1 AND status = 'active'""",
-        (initiative_id,)
+    # Required documents for the stage and uploaded required documents
+    required_docs, (completed, uploaded_types) = await asyncio.gather(
+        get_stage_requirements(initiative["stage"]),
+        get_uploaded_required(initiative_id)
     )
     
     total_required = len(required_docs)
-    completed = len(uploaded_docs)
     
     # Find missing documents
-    uploaded_types = {doc["document_type"] for doc in uploaded_docs if doc["document_type"]}
     required_types = {doc["name"] for doc in required_docs}
     missing = list(required_types - uploaded_types)
     
@@ -598,30 +597,16 @@ async def list_required_documents(
 ):
     """List required documents for an initiative based on its stage"""
     # Get initiative stage
-    initiative = execute_one("SELECT * FROM initiatives WHERE id = ?", (initiative_id,))
+    initiative = await aone("SELECT stage FROM initiatives WHERE id = ?", (initiative_id,))
     if not initiative:
         raise HTTPException(status_code=404, detail="Initiative not found")
     
-    # Get required documents for this stage
-    required = execute_query(
-        """SELECT dr.*, dt.file_path as template_path
-           FROM document_requirements dr
-           LEFT JOIN document_templates dt ON dr.template_id = dt.id
-           WHERE dr.is_mandatory = 1 AND (dr.stage = ? OR dr.stage IS NULL)
-           ORDER BY dr.name""",
-        (initiative["stage"],)
+    # Required documents for this stage and which are already uploaded
+    required, (_, uploaded_types) = await asyncio.gather(
+        get_stage_requirements(initiative["stage"]),
+        get_uploaded_required(initiative_id)
     )
     
-    # Check which are already uploaded
-    uploaded = execute_query(
-        """SELECT document_type FROM documents
-           WHERE initiative_id = ? AND library_type = 'core' 
-           AND is_required = 1 AND status = 'active'""",
-        (initiative_id,)
-    )
-    
-    uploaded_types = {doc["document_type"] for doc in uploaded if doc["document_type"]}
-    
     result = []
     for req in required:
         result.append({
@@ -637,30 +622,42 @@ async def list_required_documents(
     return result
 
 # Export endpoint
+CSV_EXPORT_BATCH_ROWS = 500
+
 @app.get("/api/export/csv")
 async def export_initiatives_csv(
     current_user = Depends(get_current_active_user)
 ):
-    """Export all initiatives as CSV"""
+    """Export all initiatives as CSV, streamed in batches"""
     import csv
     import io
     
-    initiatives = execute_query(
-        "SELECT * FROM initiatives WHERE status != 'deleted' ORDER BY created_at DESC"
+    async def csv_rows():
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(INITIATIVE_COLUMNS)
+        yield output.getvalue()
+        # One page per query, so a reader is only borrowed while a page is
+        # fetched and a slow download never holds a pooled connection
+        rows = await aquery(EXPORT_INITIATIVES_SQL, (CSV_EXPORT_BATCH_ROWS,))
+        while rows:
+            output.seek(0)
+            output.truncate(0)
+            writer.writerows(rows)
+            yield output.getvalue()
+            if len(rows) < CSV_EXPORT_BATCH_ROWS:
+                break
+            last = rows[-1]
+            rows = await aquery(
+                EXPORT_INITIATIVES_AFTER_SQL,
+                (last["created_at"], last["id"], CSV_EXPORT_BATCH_ROWS)
+            )
+    
+    return StreamingResponse(
+        csv_rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=initiatives.csv"}
     )
-    
-    output = io.StringIO()
-    if initiatives:
-        fieldnames = initiatives[0].keys()
-        writer = csv.DictWriter(output, fieldnames=fieldnames)
-        writer.writeheader()
-        for initiative in initiatives:
-            writer.writerow(dict(initiative))
-    
-    response = output.getvalue()
-    output.close()
-    
-    return response
 
 # Chat endpoints
 
@@ -670,12 +667,12 @@ async def setup_claude_api_key(
     current_user = Depends(get_current_active_user)
 ):
     """Setup user's Claude API key"""
-    # Validate the API key
-    if not validate_claude_api_key(request.api_key):
+    # Validate the API key (network call - kept off the database executor)
+    if not await run_in_threadpool(validate_claude_api_key, request.api_key):
         raise HTTPException(status_code=400, detail="Invalid Claude API key")
     
     # Store the encrypted key
-    if not store_user_api_key(current_user["username"], request.api_key):
+    if not await asyncio.to_thread(store_user_api_key, current_user["username"], request.api_key):
         raise HTTPException(status_code=500, detail="Failed to store API key")
     
     return {"status": "connected", "model": "claude-3-5-sonnet-20240620"}
@@ -683,7 +680,7 @@ async def setup_claude_api_key(
 @app.get("/api/chat/status", response_model=ChatStatusResponse)
 async def get_chat_status(current_user = Depends(get_current_active_user)):
     """Check if user has Claude API key configured"""
-    api_key = get_user_api_key(current_user["username"])
+    api_key = await asyncio.to_thread(get_user_api_key, current_user["username"])
     has_key = api_key is not None
     
     return {
@@ -692,24 +689,35 @@ async def get_chat_status(current_user = Depends(get_current_active_user)):
         "model": "claude-3-5-sonnet-20240620" if has_key else None
     }
 
+# Initiatives sent to Claude per question; also bounds the IN (...) sizes
+MAX_CTX_INITIATIVES = 32
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_with_claude(
     request: ChatRequest,
     current_user = Depends(get_current_active_user)
 ):
     """Process chat query using user's Claude API key"""
-    # Get initiatives context if IDs provided
-    initiatives = []
-    if request.initiative_ids:
-        id_placeholders = ','.join(['?'] * len(request.initiative_ids))
-        initiatives = execute_query(
-            f"SELECT * FROM initiatives WHERE id IN ({id_placeholders}) AND status != 'deleted'",
-            request.initiative_ids
+    initiative_ids = request.initiative_ids or []
+    
+    async def fetch_initiatives():
+        if not initiative_ids:
+            return []
+        query, params = in_clause_query(
+            CHAT_CONTEXT_SQL, initiative_ids[:MAX_CTX_INITIATIVES]
         )
-        initiatives = [dict(init) for init in initiatives]
+        return [dict(init) for init in await aquery(query, params)]
+    
+    # Load the initiatives context and the user's API key concurrently
+    initiatives, api_key = await asyncio.gather(
+        fetch_initiatives(),
+        asyncio.to_thread(get_user_api_key, current_user["username"])
+    )
     
     # Process the chat query
-    result = process_chat_query(current_user["username"], request.query, initiatives)
+    result = await process_chat_query(
+        current_user["username"], request.query, initiatives, api_key
+    )
     
     if "error" in result:
         if "API key" in result["error"]:
@@ -717,12 +725,21 @@ async def chat_with_claude(
         else:
             raise HTTPException(status_code=500, detail=result["error"])
     
-    return {"response": result["response"]}
+    response = result["response"]
+    # The frontend sends every initiative on screen (up to 50), so say when
+    # some of them were left out rather than rejecting the question
+    if len(initiative_ids) > MAX_CTX_INITIATIVES:
+        response = (
+            f"Note: only the first {MAX_CTX_INITIATIVES} of the "
+            f"{len(initiative_ids)} selected initiatives were used as context.\n\n"
+            + response
+        )
+    return {"response": response}
 
 @app.delete("/api/chat/disconnect")
 async def disconnect_claude(current_user = Depends(get_current_active_user)):
     """Remove user's Claude API key"""
-    if not delete_user_api_key(current_user["username"]):
+    if not await asyncio.to_thread(delete_user_api_key, current_user["username"]):
         raise HTTPException(status_code=500, detail="Failed to remove API key")
     
     return {"status": "disconnected"}
@@ -734,29 +751,10 @@ async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
 # Static file serving for production
-static_dir = os.path.join(os.path.dirname(__file__), "..", "frontend", "dist")
+static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "dist"))
 if os.path.exists(static_dir):
-    app.mount("/static", StaticFiles(directory=static_dir), name="static")
-    
-    @app.get("/")
-    async def serve_spa():
-        """Serve the React SPA"""
-        return FileResponse(os.path.join(static_dir, "index.html"))
-    
-    @app.get("/{full_path:path}")
-    async def serve_spa_routes(full_path: str):
-        """Catch all for React Router"""
-        # If it's an API route, let it pass through
-        if full_path.startswith("api/") or full_path.startswith("docs") or full_path.startswith("health"):
-            raise HTTPException(status_code=404, detail="Not found")
-        
-        # Check if file exists in static directory
-        file_path = os.path.join(static_dir, full_path)
-        if os.path.isfile(file_path):
-            return FileResponse(file_path)
-        
-        # Otherwise serve index.html for React Router
-        return FileResponse(os.path.join(static_dir, "index.html"))
+    # Mounted after every API route so those still match first
+    app.mount("/", SPAStaticFiles(directory=static_dir, html=True), name="spa")
 else:
     # Development mode - just show API info
     @app.get("/")
@@ -771,4 +769,8 @@ else:
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
+    # One process: the in-memory caches are per-process and not shared
+    uvicorn.run(
+        app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools",
+        limit_concurrency=int(os.getenv("MAX_CONCURRENT_REQUESTS", "200"))
+    )
\ No newline at end of file
@@ -1,10 +1,16 @@
-from datetime import datetime, timedelta
+import hashlib
+import os
+import threading
+import time
+from datetime import timedelta
 from typing import Optional
-from jose import JWTError, jwt
+from cachetools import TLRUCache, TTLCache
+import jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from database import execute_one, execute_update
+from database import execute_one, execute_update, aone
+import last_login_queue
 from models import TokenData
 
 # Configuration
@@ -12,11 +18,34 @@ SECRET_KEY = "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24  # 24 hours
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Login cost is dominated by bcrypt; hashes made with a lower cost are
+# rehashed on the next successful login, higher-cost ones are left alone
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS, bcrypt__min_rounds=BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Short-lived cache of user rows keyed by username, so authenticated
+# requests don't hit the database on every call
+_user_cache = TTLCache(maxsize=1024, ttl=30)
+# Guards _user_cache, which is also written from worker threads (login)
+_user_cache_lock = threading.Lock()
+
+# Usernames of already-verified tokens keyed by a digest of the token; each
+# entry expires at the token's own exp claim so expired tokens aren't served
+_token_cache = TLRUCache(
+    maxsize=10000, ttu=lambda _key, value, _now: value[1], timer=time.time
+)
+
+def invalidate_cached_user(username: str) -> None:
+    """Drop a cached user row (call after mutating the user)"""
+    with _user_cache_lock:
+        _user_cache.pop(username, None)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
+    """Verify a password against its hash (passlib compares in constant time)"""
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
@@ -26,7 +55,7 @@ def get_password_hash(password: str) -> str:
 def authenticate_user(username: str, password: str):
     """Authenticate a user by username and password"""
     user = execute_one(
-        "SELECT * FROM users WHERE username = ?",
+        "SELECT id, username, hashed_password, role FROM users WHERE username = ?",
         (username,)
     )
     if not user:
@@ -34,22 +63,23 @@ def authenticate_user(username: str, password: str):
     if not verify_password(password, user["hashed_password"]):
         return False
     
-    # Update last login
-    execute_update(
-        "UPDATE users SET last_login = ? WHERE id = ?",
-        (datetime.utcnow(), user["id"])
-    )
+    if pwd_context.needs_update(user["hashed_password"]):
+        execute_update(
+            "UPDATE users SET hashed_password = ? WHERE id = ?",
+            (get_password_hash(password), user["id"])
+        )
+        invalidate_cached_user(username)
     
+    last_login_queue.record(user["id"])
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
+    if not expires_delta:
+        expires_delta = timedelta(minutes=15)
+    # Epoch seconds, the form the exp claim is encoded in anyway
+    to_encode.update({"exp": int(time.time() + expires_delta.total_seconds())})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
@@ -60,22 +90,35 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        role: str = payload.get("role")
-        if username is None:
+    token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _token_cache.get(token_key)
+    if cached is not None:
+        username = cached[0]
+    else:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            username: str = payload.get("sub")
+            role: str = payload.get("role")
+            if username is None:
+                raise credentials_exception
+            token_data = TokenData(username=username, role=role)
+        except jwt.PyJWTError:
             raise credentials_exception
-        token_data = TokenData(username=username, role=role)
-    except JWTError:
-        raise credentials_exception
+        if "exp" in payload:
+            _token_cache[token_key] = (token_data.username, payload["exp"])
     
-    user = execute_one(
-        "SELECT * FROM users WHERE username = ?",
-        (token_data.username,)
-    )
+    with _user_cache_lock:
+        user = _user_cache.get(username)
     if user is None:
-        raise credentials_exception
+        user = await aone(
+            "SELECT id, username, email, role FROM users WHERE username = ?",
+            (username,)
+        )
+        if user is None:
+            _token_cache.pop(token_key, None)
+            raise credentials_exception
+        with _user_cache_lock:
+            _user_cache[username] = user
     return user
 
 async def get_current_active_user(current_user = Depends(get_current_user)):
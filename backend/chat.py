@@ -1,34 +1,82 @@
+import asyncio
+import base64
 import os
 import json
 from datetime import datetime
+from functools import lru_cache
 from typing import List, Dict, Optional
 from cryptography.fernet import Fernet
-from anthropic import Anthropic
-from database import execute_query, execute_one, execute_insert, execute_update
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from anthropic import Anthropic, AsyncAnthropic
+from database import execute_query, execute_one, execute_insert, execute_update, IS_PRODUCTION
+
+# Generated development key, shared by every worker and kept across restarts
+DEV_KEY_PATH = os.path.join(os.path.dirname(__file__), ".chat_encryption_key")
 
 # Generate or get encryption key from environment
 def get_encryption_key() -> bytes:
-    """Get or generate encryption key for API keys"""
+    """Get encryption key for API keys (generated and kept locally in development)"""
     key_str = os.getenv("CHAT_ENCRYPTION_KEY")
-    if not key_str:
-        # Generate a new key for development
-        key = Fernet.generate_key()
-        print(f"Generated new encryption key: {key.decode()}")
-        print("Add this to your .env file as CHAT_ENCRYPTION_KEY=<key>")
-        return key
-    return key_str.encode()
-
-# Initialize Fernet cipher
+    if key_str:
+        return key_str.encode()
+    if IS_PRODUCTION:
+        # A per-process key would make keys stored by other workers unreadable
+        raise RuntimeError("CHAT_ENCRYPTION_KEY must be set in production")
+    
+    if os.path.exists(DEV_KEY_PATH):
+        with open(DEV_KEY_PATH, "rb") as f:
+            return f.read().strip()
+    
+    # Write the key aside and link it into place, so concurrently starting
+    # workers either create the file or read the complete one
+    key = Fernet.generate_key()
+    tmp_path = f"{DEV_KEY_PATH}.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(key)
+    os.chmod(tmp_path, 0o600)
+    try:
+        os.link(tmp_path, DEV_KEY_PATH)
+        print(f"Generated new encryption key in {DEV_KEY_PATH}")
+        print("Set CHAT_ENCRYPTION_KEY in your .env file to use your own")
+    except FileExistsError:
+        with open(DEV_KEY_PATH, "rb") as f:
+            key = f.read().strip()
+    finally:
+        os.remove(tmp_path)
+    return key
+
+# Read (or fail on a missing production key) at import time
 ENCRYPTION_KEY = get_encryption_key()
-cipher_suite = Fernet(ENCRYPTION_KEY)
+
+@lru_cache(maxsize=None)
+def get_fernet() -> Fernet:
+    """Fernet cipher, only needed to read API keys stored before AES-GCM"""
+    return Fernet(ENCRYPTION_KEY)
+
+@lru_cache(maxsize=None)
+def get_aes_gcm() -> AESGCM:
+    """AES-GCM cipher for API keys, keyed off CHAT_ENCRYPTION_KEY"""
+    return AESGCM(HKDF(
+        algorithm=hashes.SHA256(), length=32, salt=None, info=b"user-api-keys/aes-gcm"
+    ).derive(base64.urlsafe_b64decode(ENCRYPTION_KEY)))
+
+# Prefix marking AES-GCM ciphertexts (Fernet tokens always start with "gAAAAA")
+GCM_PREFIX = "v2:"
 
 def encrypt_api_key(api_key: str) -> str:
     """Encrypt API key for secure storage"""
-    return cipher_suite.encrypt(api_key.encode()).decode()
+    nonce = os.urandom(12)
+    ciphertext = get_aes_gcm().encrypt(nonce, api_key.encode(), None)
+    return GCM_PREFIX + base64.urlsafe_b64encode(nonce + ciphertext).decode()
 
 def decrypt_api_key(encrypted_key: str) -> str:
-    """Decrypt stored API key"""
-    return cipher_suite.decrypt(encrypted_key.encode()).decode()
+    """Decrypt stored API key (AES-GCM, or Fernet for keys stored before it)"""
+    if encrypted_key.startswith(GCM_PREFIX):
+        data = base64.urlsafe_b64decode(encrypted_key[len(GCM_PREFIX):])
+        return get_aes_gcm().decrypt(data[:12], data[12:], None).decode()
+    return get_fernet().decrypt(encrypted_key.encode()).decode()
 
 def validate_claude_api_key(api_key: str) -> bool:
     """Validate Claude API key by making a test call"""
@@ -86,9 +134,20 @@ def get_user_api_key(user_id: str) -> Optional[str]:
             (user_id,)
         )
         
-        if result:
-            return decrypt_api_key(result["encrypted_claude_key"])
-        return None
+        if not result:
+            return None
+        
+        encrypted_key = result["encrypted_claude_key"]
+        api_key = decrypt_api_key(encrypted_key)
+        if not encrypted_key.startswith(GCM_PREFIX):
+            # Re-encrypt legacy Fernet rows with AES-GCM, unless the row has
+            # been rewritten since we read it (e.g. a new key was just stored)
+            execute_update(
+                "UPDATE user_api_keys SET encrypted_claude_key = ? "
+                "WHERE user_id = ? AND encrypted_claude_key NOT LIKE 'v2:%'",
+                (encrypt_api_key(api_key), user_id)
+            )
+        return api_key
     except Exception as e:
         print(f"Failed to get API key: {e}")
         return None
@@ -115,39 +174,55 @@ def update_key_usage(user_id: str) -> None:
     except Exception as e:
         print(f"Failed to update key usage: {e}")
 
+# Strong references to in-flight usage updates so they aren't garbage collected
+_usage_tasks = set()
+
+# One Claude client (and so one connection pool) shared by every chat;
+# each request uses a copy of it carrying the user's own API key
+_chat_client: Optional[AsyncAnthropic] = None
+
+def get_chat_client(api_key: str) -> AsyncAnthropic:
+    """Get a Claude client for an API key, reusing the shared connection pool"""
+    global _chat_client
+    if _chat_client is None:
+        _chat_client = AsyncAnthropic(timeout=30.0)
+    return _chat_client.with_options(api_key=api_key)
+
+async def close_chat_client() -> None:
+    """Close the shared Claude client's connections (called on shutdown)"""
+    global _chat_client
+    if _chat_client is not None:
+        client, _chat_client = _chat_client, None
+        await client.close()
+
 def format_initiatives_context(initiatives: List[Dict]) -> str:
     """Format initiatives data for Claude context"""
     if not initiatives:
         return "No initiatives are currently visible in the table."
     
-    context = f"Currently viewing {len(initiatives)} AI initiatives:\n\n"
+    parts = [f"Currently viewing {len(initiatives)} AI initiatives:\n\n"]
     
     for init in initiatives:
-        context += f"Initiative: {init.get('title', 'N/A')}\n"
-        context += f"  Owner: {init.get('program_owner', 'N/A')}\n"
-        context += f"  Department: {init.get('department', 'N/A')}\n"
-        context += f"  Stage: {init.get('stage', 'N/A')}\n"
+        parts.append(f"Initiative: {init.get('title', 'N/A')}\n")
+        parts.append(f"  Owner: {init.get('program_owner', 'N/A')}\n")
+        parts.append(f"  Department: {init.get('department', 'N/A')}\n")
+        parts.append(f"  Stage: {init.get('stage', 'N/A')}\n")
         if init.get('background'):
-            context += f"  Background: {init.get('background')}\n"
+            parts.append(f"  Background: {init.get('background')}\n")
         if init.get('goal'):
-            context += f"  Goal: {init.get('goal')}\n"
-        context += "\n"
+            parts.append(f"  Goal: {init.get('goal')}\n")
+        parts.append("\n")
     
-    return context
+    return "".join(parts)
 
-def process_chat_query(user_id: str, query: str, initiatives: List[Dict]) -> Dict:
+async def process_chat_query(user_id: str, query: str, initiatives: List[Dict],
+                             api_key: Optional[str]) -> Dict:
     """Process chat query using user's API key"""
     try:
-        # Get user's API key
-        api_key = get_user_api_key(user_id)
         if not api_key:
             return {"error": "No API key configured. Please set up your Claude API key first."}
         
-        # Create Claude client
-        client = Anthropic(
-            api_key=api_key,
-            timeout=30.0
-        )
+        client = get_chat_client(api_key)
         
         # Format context
         context = format_initiatives_context(initiatives)
@@ -163,14 +238,16 @@ User Question: {query}
 Please provide a helpful response based on the initiative data shown above. If the question is about specific initiatives, reference them by name. Be concise but informative."""
 
         # Call Claude API
-        response = client.messages.create(
+        response = await client.messages.create(
             model="claude-3-5-sonnet-20240620",
             max_tokens=1000,
             messages=[{"role": "user", "content": full_prompt}]
         )
         
-        # Update usage statistics
-        update_key_usage(user_id)
+        # Update usage statistics without holding up the reply
+        task = asyncio.create_task(asyncio.to_thread(update_key_usage, user_id))
+        _usage_tasks.add(task)
+        task.add_done_callback(_usage_tasks.discard)
         
         return {
             "response": response.content[0].text,
@@ -181,7 +258,7 @@ Please provide a helpful response based on the initiative data shown above. If t
         error_msg = str(e)
         if "authentication" in error_msg.lower() or "api_key" in error_msg.lower():
             # Invalid API key, remove it
-            delete_user_api_key(user_id)
+            await asyncio.to_thread(delete_user_api_key, user_id)
             return {"error": "API key appears to be invalid or expired. Please reconfigure your Claude API key."}
         
         return {"error": f"Chat processing failed: {error_msg}"}
\ No newline at end of file
@@ -1,12 +1,21 @@
+import asyncio
+import itertools
+import re
 import sqlite3
 from contextlib import contextmanager
 import os
-from typing import Optional
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional, Sequence
+import orjson
 
 # Only import psycopg2 in production
 try:
     import psycopg2
     import psycopg2.extras
+    import psycopg2.pool
     PSYCOPG2_AVAILABLE = True
 except ImportError:
     PSYCOPG2_AVAILABLE = False
@@ -18,51 +27,288 @@ IS_PRODUCTION = DATABASE_URL is not None and PSYCOPG2_AVAILABLE
 if not IS_PRODUCTION:
     DATABASE_PATH = os.path.join(os.path.dirname(__file__), "database.db")
 
+# Number of pooled SQLite reader connections (plus one writer)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# Postgres connections: one per database executor thread plus headroom for
+# sync calls made from the default threadpool; callers wait for a free slot rather than hitting
+# ThreadedConnectionPool's "pool exhausted" error
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", (DB_POOL_SIZE + 1) * 2))
+
+# Prepared statements kept per connection; sized to hold the pre-built
+# list queries and bucketed IN (...) lookups
+SQLITE_STATEMENT_CACHE_SIZE = 256
+
+# Applied once per pooled SQLite connection
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA mmap_size=268435456",
+)
+
+class ConnectionPool:
+    """Process-wide SQLite pool: one writer connection plus N reader connections"""
+
+    def __init__(self, db_path: str, readers: int = DB_POOL_SIZE):
+        self.db_path = db_path
+        self._write_lock = threading.Lock()
+        self._writer = self._connect()
+        self._readers = queue.Queue()
+        for _ in range(max(readers, 1)):
+            self._readers.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False,
+            cached_statements=SQLITE_STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = sqlite3.Row
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def acquire_read(self):
+        """Borrow a reader connection, returning it to the pool afterwards"""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def acquire_write(self):
+        """Hold the single writer connection for one transaction"""
+        with self._write_lock:
+            try:
+                yield self._writer
+                self._writer.commit()
+            except Exception:
+                self._writer.rollback()
+                raise
+
+    def close(self):
+        """Close every pooled connection"""
+        with self._write_lock:
+            self._writer.close()
+        while not self._readers.empty():
+            self._readers.get_nowait().close()
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide SQLite pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH)
+    return _pool
+
+# Postgres statements are prepared server-side once a connection has run
+# them this many times (0 disables, e.g. behind a transaction-mode pgbouncer)
+PG_PREPARE_THRESHOLD = int(os.getenv("PG_PREPARE_THRESHOLD", "5"))
+PG_MAX_PREPARED = 256
+
+# Only these statement types can be PREPAREd
+PG_PREPARABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES")
+_PG_PARAM_RE = re.compile(r"%[s%]")
+
+@lru_cache(maxsize=256)
+def _pg_prepare_sql(query: str) -> str:
+    """Rewrite a psycopg2 (%s) query into PREPARE's $1, $2, ... form"""
+    counter = itertools.count(1)
+    return _PG_PARAM_RE.sub(
+        lambda m: "%" if m.group() == "%%" else f"${next(counter)}", query
+    )
+
+if PSYCOPG2_AVAILABLE:
+    class _PreparingCursorMixin:
+        """Run frequently repeated queries through PREPARE / EXECUTE"""
+
+        def execute(self, query, vars=None):
+            conn = self.connection
+            if (not PG_PREPARE_THRESHOLD or self.name or not isinstance(vars, tuple)
+                    or not isinstance(conn, PreparingConnection)):
+                return super().execute(query, vars)
+            
+            if query not in conn.prepared:
+                uses = conn.statement_uses.get(query, 0) + 1
+                if (uses < PG_PREPARE_THRESHOLD or len(conn.prepared) >= PG_MAX_PREPARED
+                        or not query.lstrip()[:6].upper().startswith(PG_PREPARABLE)):
+                    if len(conn.statement_uses) < PG_MAX_PREPARED * 16:
+                        conn.statement_uses[query] = uses
+                    return super().execute(query, vars)
+                self._prepare(query)
+            
+            name = conn.prepared[query]
+            if name is None:
+                return super().execute(query, vars)
+            return super().execute(f"EXECUTE {name} ({', '.join(['%s'] * len(vars))})", vars)
+
+        def _prepare(self, query):
+            conn = self.connection
+            name = f"stmt_{len(conn.prepared)}"
+            conn.statement_uses.pop(query, None)
+            # Under a savepoint, so a statement Postgres can't prepare (say, a
+            # parameter whose type it can't infer) just runs unprepared
+            super().execute("SAVEPOINT prepare_statement")
+            try:
+                super().execute(f"PREPARE {name} AS {_pg_prepare_sql(query)}")
+            except psycopg2.Error:
+                super().execute("ROLLBACK TO SAVEPOINT prepare_statement")
+                name = None
+            super().execute("RELEASE SAVEPOINT prepare_statement")
+            conn.prepared[query] = name
+
+    class PreparingCursor(_PreparingCursorMixin, psycopg2.extensions.cursor):
+        pass
+
+    class PreparingDictCursor(_PreparingCursorMixin, psycopg2.extras.RealDictCursor):
+        pass
+
+    class PreparingConnection(psycopg2.extensions.connection):
+        """Connection remembering which of its queries are prepared (they live per session)"""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.cursor_factory = PreparingCursor
+            self.statement_uses = {}
+            self.prepared = {}
+
+_pg_pool = None
+_pg_pool_slots = threading.BoundedSemaphore(PG_POOL_MAX)
+
+def get_pg_pool():
+    """Return the process-wide Postgres pool, creating it on first use"""
+    global _pg_pool
+    if _pg_pool is None:
+        with _pool_lock:
+            if _pg_pool is None:
+                _pg_pool = psycopg2.pool.ThreadedConnectionPool(
+                    1, PG_POOL_MAX, DATABASE_URL, connection_factory=PreparingConnection
+                )
+    return _pg_pool
+
+def init_pool():
+    """Open pooled connections up front (called on application startup)"""
+    if IS_PRODUCTION:
+        get_pg_pool()
+    else:
+        get_pool()
+
+def close_pool():
+    """Close pooled connections (called on application shutdown)"""
+    global _pool, _pg_pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+        if _pg_pool is not None:
+            _pg_pool.closeall()
+            _pg_pool = None
+
 @contextmanager
 def get_db():
     """Database connection context manager - supports both SQLite and PostgreSQL"""
     if IS_PRODUCTION:
-        # PostgreSQL for production
-        conn = psycopg2.connect(DATABASE_URL)
-        conn.autocommit = False
-        try:
+        # PostgreSQL for production - pooled connections
+        with _pg_pool_slots:
+            pool = get_pg_pool()
+            conn = pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception as e:
+                if not conn.closed:
+                    conn.rollback()
+                raise e
+            finally:
+                # Connections broken mid-request are discarded, not reused
+                pool.putconn(conn, close=bool(conn.closed))
+    else:
+        # SQLite for local development - shared pooled writer connection
+        with get_pool().acquire_write() as conn:
+            yield conn
+
+@contextmanager
+def get_read_db():
+    """Read-only connection context manager - uses a pooled reader on SQLite"""
+    if IS_PRODUCTION:
+        with get_db() as conn:
             yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
     else:
-        # SQLite for local development
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        try:
+        with get_pool().acquire_read() as conn:
             yield conn
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+
+@lru_cache(maxsize=256)
+def _pg_query(query: str) -> str:
+    # psycopg2 uses %s placeholders, so literal % signs must be doubled
+    return query.replace("%", "%%").replace("?", "%s")
 
 def _convert_query_params(query: str, params: Optional[tuple] = None):
-    """Convert SQLite ? placeholders to PostgreSQL $1, $2, etc. for production"""
+    """Convert SQLite ? placeholders to psycopg2's %s for production"""
     if IS_PRODUCTION and params:
-        # Convert ? placeholders to PostgreSQL format
-        converted_query = query
-        for i in range(len(params)):
-            converted_query = converted_query.replace('?', f'${i+1}', 1)
-        return converted_query, params
+        return _pg_query(query), params
     return query, params
 
+# Sentinel id used to pad IN (...) lists up to their bucket size
+IN_CLAUSE_PAD = -1
+
+@lru_cache(maxsize=64)
+def _in_clause_sql(sql_template: str, size: int) -> str:
+    return sql_template.format(placeholders=",".join(["?"] * size))
+
+def in_clause_query(sql_template: str, values: Sequence) -> tuple:
+    """Expand an "IN ({placeholders})" template for the given values.
+
+    The placeholder count is rounded up to the next power of two and the
+    values padded with IN_CLAUSE_PAD, so only a handful of distinct SQL
+    strings exist and the driver's prepared statement cache keeps hitting.
+    """
+    size = 1
+    while size < len(values):
+        size *= 2
+    padded = tuple(values) + (IN_CLAUSE_PAD,) * (size - len(values))
+    return _in_clause_sql(sql_template, size), padded
+
+# Each initiative's active documents as one JSON array column (json_agg on
+# Postgres, json_group_array on SQLite); read it back with decode_json
+if IS_PRODUCTION:
+    INITIATIVE_DOCUMENTS_SQL = """COALESCE((
+        SELECT json_agg(json_build_object(
+            'id', id, 'filename', filename, 'library_type', library_type,
+            'document_type', document_type, 'file_size', file_size, 'uploaded_at', uploaded_at
+        ) ORDER BY uploaded_at DESC)
+        FROM documents WHERE initiative_id = initiatives.id AND status = 'active'
+    ), '[]'::json) AS documents"""
+else:
+    INITIATIVE_DOCUMENTS_SQL = """COALESCE((
+        SELECT json_group_array(json_object(
+            'id', id, 'filename', filename, 'library_type', library_type,
+            'document_type', document_type, 'file_size', file_size, 'uploaded_at', uploaded_at
+        ))
+        FROM (
+            SELECT * FROM documents
+            WHERE initiative_id = initiatives.id AND status = 'active'
+            ORDER BY uploaded_at DESC
+        )
+    ), '[]') AS documents"""
+
+def decode_json(value):
+    """Decode a JSON column value (SQLite returns text, psycopg2 decodes it already)"""
+    return value if IS_PRODUCTION else orjson.loads(value)
+
 def execute_query(query: str, params: Optional[tuple] = None):
     """Execute a query and return results"""
     query, params = _convert_query_params(query, params)
     
-    with get_db() as conn:
+    with get_read_db() as conn:
         if IS_PRODUCTION:
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor = conn.cursor(cursor_factory=PreparingDictCursor)
         else:
             cursor = conn.cursor()
         
@@ -76,9 +322,9 @@ def execute_one(query: str, params: Optional[tuple] = None):
     """Execute a query and return single result"""
     query, params = _convert_query_params(query, params)
     
-    with get_db() as conn:
+    with get_read_db() as conn:
         if IS_PRODUCTION:
-            cursor = conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor)
+            cursor = conn.cursor(cursor_factory=PreparingDictCursor)
         else:
             cursor = conn.cursor()
         
@@ -113,6 +359,40 @@ def execute_insert(query: str, params: Optional[tuple] = None):
             # SQLite - use lastrowid
             return cursor.lastrowid
 
+def execute_returning(query: str, params: Optional[tuple] = None):
+    """Execute an insert/update with a RETURNING clause and return the first row"""
+    query, params = _convert_query_params(query, params)
+    
+    with get_db() as conn:
+        if IS_PRODUCTION:
+            cursor = conn.cursor(cursor_factory=PreparingDictCursor)
+        else:
+            cursor = conn.cursor()
+        
+        if params:
+            cursor.execute(query, params)
+        else:
+            cursor.execute(query)
+        row = cursor.fetchone()
+        # Drain so the statement completes before commit
+        cursor.fetchall()
+        return row
+
+_VALUES_RE = re.compile(r"VALUES\s*\([^)]*\)", re.IGNORECASE)
+
+def insert_many(cursor, query: str, rows: Sequence[tuple]) -> None:
+    """Run a single-row "INSERT ... VALUES (?, ...)" for many rows on an open cursor.
+
+    On Postgres the rows are sent as multi-row INSERTs via execute_values
+    (psycopg2's executemany is one round trip per row); SQLite uses executemany.
+    """
+    if IS_PRODUCTION:
+        # execute_values wants the row placeholder as a single "VALUES %s"
+        pg_query = _pg_query(_VALUES_RE.sub("VALUES ?", query, count=1))
+        psycopg2.extras.execute_values(cursor, pg_query, rows, page_size=1000)
+    else:
+        cursor.executemany(query, rows)
+
 def execute_update(query: str, params: Optional[tuple] = None):
     """Execute an update/delete and return affected rows"""
     query, params = _convert_query_params(query, params)
@@ -123,4 +403,32 @@ def execute_update(query: str, params: Optional[tuple] = None):
             cursor.execute(query, params)
         else:
             cursor.execute(query)
-        return cursor.rowcount
\ No newline at end of file
+        return cursor.rowcount
+
+# Async wrappers - run blocking database calls on a dedicated executor with
+# one thread per pooled connection (readers + writer), so they never queue
+# behind bcrypt or decryption work in the default executor
+_db_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE + 1, thread_name_prefix="db")
+
+async def _run_db(func, query: str, params: Optional[tuple]):
+    return await asyncio.get_running_loop().run_in_executor(_db_executor, func, query, params)
+
+async def aquery(query: str, params: Optional[tuple] = None):
+    """Async variant of execute_query"""
+    return await _run_db(execute_query, query, params)
+
+async def aone(query: str, params: Optional[tuple] = None):
+    """Async variant of execute_one"""
+    return await _run_db(execute_one, query, params)
+
+async def ainsert(query: str, params: Optional[tuple] = None):
+    """Async variant of execute_insert"""
+    return await _run_db(execute_insert, query, params)
+
+async def areturning(query: str, params: Optional[tuple] = None):
+    """Async variant of execute_returning"""
+    return await _run_db(execute_returning, query, params)
+
+async def aupdate(query: str, params: Optional[tuple] = None):
+    """Async variant of execute_update"""
+    return await _run_db(execute_update, query, params)
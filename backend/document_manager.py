@@ -2,100 +2,98 @@
 Document management utilities for three-tier document system
 """
 import os
+import secrets
 import shutil
-from typing import Optional, Dict, List
+from functools import lru_cache
+from typing import Optional, Dict, List, NamedTuple
 from datetime import datetime
 from pathlib import Path
 
 # Base upload directory
-UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "..", "uploads")
+UPLOAD_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "uploads"))
+
+# Admin library directories by category, resolved once
+ADMIN_DIRS = {
+    "policy": os.path.join(UPLOAD_DIR, "admin", "policies"),
+    "template": os.path.join(UPLOAD_DIR, "admin", "templates"),
+    "howto": os.path.join(UPLOAD_DIR, "admin", "howtos"),
+}
+ADMIN_ROOT = os.path.join(UPLOAD_DIR, "admin")
 
 def ensure_directory_structure():
     """Ensure all required directories exist"""
     # Admin directories
-    admin_dirs = [
-        os.path.join(UPLOAD_DIR, "admin", "policies"),
-        os.path.join(UPLOAD_DIR, "admin", "templates"),
-        os.path.join(UPLOAD_DIR, "admin", "howtos")
-    ]
-    
-    for dir_path in admin_dirs:
+    for dir_path in ADMIN_DIRS.values():
         os.makedirs(dir_path, exist_ok=True)
     
     # Initiatives directory
     os.makedirs(os.path.join(UPLOAD_DIR, "initiatives"), exist_ok=True)
 
-def get_initiative_directories(initiative_id: int):
-    """Create and return initiative-specific directories"""
+class InitiativeDirs(NamedTuple):
+    base: str
+    core: str
+    core_required: str
+    core_optional: str
+    ancillary: str
+
+@lru_cache(maxsize=4096)
+def initiative_paths(initiative_id: int) -> InitiativeDirs:
+    """Return initiative-specific directory paths without touching the disk"""
     base_path = os.path.join(UPLOAD_DIR, "initiatives", str(initiative_id))
-    
     core_path = os.path.join(base_path, "core")
-    core_required_path = os.path.join(core_path, "required")
-    core_optional_path = os.path.join(core_path, "optional")
-    ancillary_path = os.path.join(base_path, "ancillary")
     
-    # Create directories if they don't exist
-    for path in [core_required_path, core_optional_path, ancillary_path]:
+    return InitiativeDirs(
+        base=base_path,
+        core=core_path,
+        core_required=os.path.join(core_path, "required"),
+        core_optional=os.path.join(core_path, "optional"),
+        ancillary=os.path.join(base_path, "ancillary")
+    )
+
+@lru_cache(maxsize=4096)
+def get_initiative_directories(initiative_id: int) -> InitiativeDirs:
+    """Create (once per process) and return initiative-specific directories"""
+    dirs = initiative_paths(initiative_id)
+    for path in (dirs.core_required, dirs.core_optional, dirs.ancillary):
         os.makedirs(path, exist_ok=True)
-    
-    return {
-        "base": base_path,
-        "core": core_path,
-        "core_required": core_required_path,
-        "core_optional": core_optional_path,
-        "ancillary": ancillary_path
-    }
+    return dirs
 
 def get_document_path(library_type: str, category: Optional[str] = None, 
                      initiative_id: Optional[int] = None, is_required: bool = False) -> str:
     """Get the appropriate file path based on document type and category"""
     
     if library_type == "admin":
-        if category == "policy":
-            return os.path.join(UPLOAD_DIR, "admin", "policies")
-        elif category == "template":
-            return os.path.join(UPLOAD_DIR, "admin", "templates")
-        elif category == "howto":
-            return os.path.join(UPLOAD_DIR, "admin", "howtos")
-        else:
-            return os.path.join(UPLOAD_DIR, "admin")
+        return ADMIN_DIRS.get(category, ADMIN_ROOT)
     
     elif library_type == "core" and initiative_id:
         dirs = get_initiative_directories(initiative_id)
         if is_required:
-            return dirs["core_required"]
+            return dirs.core_required
         else:
-            return dirs["core_optional"]
+            return dirs.core_optional
     
     elif library_type == "ancillary" and initiative_id:
         dirs = get_initiative_directories(initiative_id)
-        return dirs["ancillary"]
+        return dirs.ancillary
     
     else:
         # Fallback to root uploads directory
         return UPLOAD_DIR
 
-def save_document_file(file_content: bytes, filename: str, library_type: str,
-                      category: Optional[str] = None, initiative_id: Optional[int] = None,
-                      is_required: bool = False) -> str:
-    """Save a document file to the appropriate location"""
+def stored_filename(filename: str) -> str:
+    """Random on-disk name keeping only the (short) extension of the original"""
+    # The original name is only kept in the database, so a name like
+    # "../../app.py" can't steer where the file is written
+    return f"{secrets.token_urlsafe(12)}{Path(filename).suffix.lower()[:8]}"
+
+def new_document_path(filename: str, library_type: str, category: Optional[str] = None,
+                      initiative_id: Optional[int] = None, is_required: bool = False) -> str:
+    """Get a unique absolute path for a new document in the appropriate location"""
     
     # Get the target directory
     target_dir = get_document_path(library_type, category, initiative_id, is_required)
     
-    # Generate unique filename with timestamp
-    timestamp = datetime.utcnow().timestamp()
-    unique_filename = f"{timestamp}_{filename}"
-    
-    # Full file path
-    file_path = os.path.join(target_dir, unique_filename)
-    
-    # Save the file
-    with open(file_path, "wb") as f:
-        f.write(file_content)
-    
-    # Return relative path from uploads directory
-    return os.path.relpath(file_path, UPLOAD_DIR)
+    return os.path.join(target_dir, stored_filename(filename))
 
 def copy_template_file(template_path: str, initiative_id: int, new_filename: str,
                       is_required: bool = True) -> str:
@@ -108,15 +106,13 @@ def copy_template_file(template_path: str, initiative_id: int, new_filename: str
     
     # Get target directory
     dirs = get_initiative_directories(initiative_id)
-    target_dir = dirs["core_required"] if is_required else dirs["core_optional"]
+    target_dir = dirs.core_required if is_required else dirs.core_optional
     
-    # Generate unique filename
-    timestamp = datetime.utcnow().timestamp()
-    unique_filename = f"{timestamp}_{new_filename}"
-    target_path = os.path.join(target_dir, unique_filename)
+    target_path = os.path.join(target_dir, stored_filename(new_filename))
     
-    # Copy the file
-    shutil.copy2(source_path, target_path)
+    # copyfile copies in-kernel via sendfile(2) on Linux; the copy is a new
+    # document, so the template's timestamps and mode aren't carried over
+    shutil.copyfile(source_path, target_path)
     
     # Return relative path
     return os.path.relpath(target_path, UPLOAD_DIR)
@@ -144,81 +140,63 @@ def delete_document_file(relative_path: str) -> bool:
     shutil.move(source_path, archive_path)
     return True
 
+def _scan_files(dir_path: str):
+    """Yield (filename, relative_path, stat) for each file in a directory"""
+    if not os.path.isdir(dir_path):
+        return
+    rel_dir = os.path.relpath(dir_path, UPLOAD_DIR)
+    # DirEntry caches the stat so each file costs a single syscall
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_file():
+                yield entry.name, os.path.join(rel_dir, entry.name), entry.stat()
+
 def list_admin_documents(category: Optional[str] = None) -> List[Dict]:
     """List all admin documents"""
     documents = []
     
     if category:
-        search_dir = get_document_path("admin", category)
-        search_dirs = [search_dir] if os.path.exists(search_dir) else []
+        search_dirs = [get_document_path("admin", category)]
     else:
         # Search all admin directories
-        search_dirs = [
-            os.path.join(UPLOAD_DIR, "admin", "policies"),
-            os.path.join(UPLOAD_DIR, "admin", "templates"),
-            os.path.join(UPLOAD_DIR, "admin", "howtos")
-        ]
+        search_dirs = list(ADMIN_DIRS.values())
     
     for dir_path in search_dirs:
-        if not os.path.exists(dir_path):
-            continue
-            
         category_name = os.path.basename(dir_path)
-        for filename in os.listdir(dir_path):
-            file_path = os.path.join(dir_path, filename)
-            if os.path.isfile(file_path):
-                rel_path = os.path.relpath(file_path, UPLOAD_DIR)
-                documents.append({
-                    "filename": filename,
-                    "relative_path": rel_path,
-                    "category": category_name,
-                    "size": os.path.getsize(file_path),
-                    "modified": datetime.fromtimestamp(os.path.getmtime(file_path))
-                })
+        for filename, rel_path, st in _scan_files(dir_path):
+            documents.append({
+                "filename": filename,
+                "relative_path": rel_path,
+                "category": category_name,
+                "size": st.st_size,
+                "modified": datetime.fromtimestamp(st.st_mtime)
+            })
     
     return documents
 
 def list_initiative_documents(initiative_id: int, library_type: Optional[str] = None) -> List[Dict]:
     """List all documents for an initiative"""
     documents = []
-    dirs = get_initiative_directories(initiative_id)
+    # Listing never needs the folders to exist, so don't create them
+    dirs = initiative_paths(initiative_id)
     
+    folders = []
     if library_type == "core" or not library_type:
-        # List core documents
-        for subtype, path in [("required", dirs["core_required"]), 
-                             ("optional", dirs["core_optional"])]:
-            if not os.path.exists(path):
-                continue
-                
-            for filename in os.listdir(path):
-                file_path = os.path.join(path, filename)
-                if os.path.isfile(file_path):
-                    rel_path = os.path.relpath(file_path, UPLOAD_DIR)
-                    documents.append({
-                        "filename": filename,
-                        "relative_path": rel_path,
-                        "library_type": "core",
-                        "is_required": subtype == "required",
-                        "size": os.path.getsize(file_path),
-                        "modified": datetime.fromtimestamp(os.path.getmtime(file_path))
-                    })
-    
+        folders += [("core", True, dirs.core_required),
+                    ("core", False, dirs.core_optional)]
     if library_type == "ancillary" or not library_type:
-        # List ancillary documents
-        path = dirs["ancillary"]
-        if os.path.exists(path):
-            for filename in os.listdir(path):
-                file_path = os.path.join(path, filename)
-                if os.path.isfile(file_path):
-                    rel_path = os.path.relpath(file_path, UPLOAD_DIR)
-                    documents.append({
-                        "filename": filename,
-                        "relative_path": rel_path,
-                        "library_type": "ancillary",
-                        "is_required": False,
-                        "size": os.path.getsize(file_path),
-                        "modified": datetime.fromtimestamp(os.path.getmtime(file_path))
-                    })
+        folders.append(("ancillary", False, dirs.ancillary))
+    
+    for folder_library_type, is_required, path in folders:
+        for filename, rel_path, st in _scan_files(path):
+            documents.append({
+                "filename": filename,
+                "relative_path": rel_path,
+                "library_type": folder_library_type,
+                "is_required": is_required,
+                "size": st.st_size,
+                "modified": datetime.fromtimestamp(st.st_mtime)
+            })
     
     return documents
 
@@ -1,13 +1,12 @@
 #!/usr/bin/env python3
 import sqlite3
 import os
-from passlib.context import CryptContext
-from database import DATABASE_PATH, get_db
+from concurrent.futures import ThreadPoolExecutor
+from auth import get_password_hash
+from database import DATABASE_PATH, IS_PRODUCTION, get_db, insert_many
 from models import (INITIATIVES_TABLE, DOCUMENTS_TABLE, USERS_TABLE, USER_API_KEYS_TABLE,
                     DOCUMENT_TEMPLATES_TABLE, DOCUMENT_REQUIREMENTS_TABLE, DOCUMENT_VERSIONS_TABLE)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 def init_database():
     """Initialize the database with tables and default users"""
     
@@ -35,14 +34,6 @@ def init_database():
             CREATE INDEX IF NOT EXISTS idx_initiatives_stage 
             ON initiatives(stage)
         """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_initiatives_status 
-            ON initiatives(status)
-        """)
-        cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_documents_initiative 
-            ON documents(initiative_id)
-        """)
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_documents_library_type 
             ON documents(library_type)
@@ -56,6 +47,53 @@ def init_database():
             ON user_api_keys(user_id)
         """)
         
+        # Composite indexes matching list_initiatives filters + default sort;
+        # status is always filtered (it defaults to active)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_initiatives_status_created 
+            ON initiatives(status, created_at DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_initiatives_status_department_created 
+            ON initiatives(status, department, created_at DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_initiatives_status_stage_created 
+            ON initiatives(status, stage, created_at DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_initiatives_status_priority_created 
+            ON initiatives(status, priority, created_at DESC)
+        """)
+        # An initiative's documents, newest first (document list and
+        # list_initiatives?include=documents)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_initiative_uploaded 
+            ON documents(initiative_id, uploaded_at DESC)
+        """)
+        # Per-library document lists and the compliance lookups
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_initiative_library_status 
+            ON documents(initiative_id, library_type, status, uploaded_at DESC)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_admin_category 
+            ON documents(category, uploaded_at DESC) WHERE library_type = 'admin'
+        """)
+        # Indexes earlier versions created that no query shape needs any more
+        for index in (
+            "idx_initiatives_status", "idx_initiatives_live_created",
+            "idx_documents_initiative", "idx_documents_initiative_status",
+        ):
+            cursor.execute(f"DROP INDEX IF EXISTS {index}")
+        # users.username is UNIQUE, so both databases already index it; on
+        # Postgres also cover the auth lookups so they skip the heap
+        if IS_PRODUCTION:
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_users_username_covering 
+                ON users(username) INCLUDE (id, email, hashed_password, role)
+            """)
+        
         # Check if users already exist
         cursor.execute("SELECT COUNT(*) FROM users")
         user_count = cursor.fetchone()[0]
@@ -63,16 +101,20 @@ def init_database():
         if user_count == 0:
             # Insert default users
             default_users = [
-                ("admin", "admin@example.com", pwd_context.hash("admin123"), "admin"),
-                ("reviewer", "reviewer@example.com", pwd_context.hash("review123"), "reviewer"),
-                ("contributor", "contributor@example.com", pwd_context.hash("contrib123"), "contributor")
+                ("admin", "admin@example.com", "admin123", "admin"),
+                ("reviewer", "reviewer@example.com", "review123", "reviewer"),
+                ("contributor", "contributor@example.com", "contrib123", "contributor")
             ]
             
-            for username, email, password, role in default_users:
-                cursor.execute("""
-                    INSERT INTO users (username, email, hashed_password, role) 
-                    VALUES (?, ?, ?, ?)
-                """, (username, email, password, role))
+            # bcrypt releases the GIL, so the hashes can be computed in parallel
+            with ThreadPoolExecutor(max_workers=len(default_users)) as pool:
+                hashes = pool.map(get_password_hash, [user[2] for user in default_users])
+            
+            insert_many(cursor, """
+                INSERT INTO users (username, email, hashed_password, role) 
+                VALUES (?, ?, ?, ?)
+            """, [(username, email, hashed, role)
+                  for (username, email, _, role), hashed in zip(default_users, hashes)])
             
             print("Default users created:")
             print("  - admin/admin123 (role: admin)")
@@ -99,16 +141,18 @@ def init_database():
                  "OCR with Tesseract, NLP with spaCy, classification with BERT")
             ]
             
-            for initiative in sample_initiatives:
-                cursor.execute("""
-                    INSERT INTO initiatives (
-                        name, description, department, stage, priority,
-                        lead_name, lead_email, business_value, technical_approach
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, initiative)
+            insert_many(cursor, """
+                INSERT INTO initiatives (
+                    name, description, department, stage, priority,
+                    lead_name, lead_email, business_value, technical_approach
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, sample_initiatives)
             
             print(f"Created {len(sample_initiatives)} sample initiatives")
         
+        # Refresh planner statistics for the indexes above
+        cursor.execute("ANALYZE")
+        
         conn.commit()
         print("Database initialized successfully!")
 
@@ -0,0 +1,90 @@
+"""
+Write-behind queue for users.last_login
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+from datetime import datetime
+from typing import Optional
+from database import execute_update, IS_PRODUCTION
+
+logger = logging.getLogger(__name__)
+
+# How often pending logins are written, in seconds
+FLUSH_INTERVAL = float(os.getenv("LAST_LOGIN_FLUSH_SECONDS", "5"))
+# Users per UPDATE statement (two CASE parameters plus one IN parameter each)
+FLUSH_BATCH_SIZE = 500
+
+# The CASE arms are bound as strings, which Postgres won't assign to a
+# TIMESTAMP column without a cast (SQLite stores them as-is)
+_TIMESTAMP_CAST = "::timestamp" if IS_PRODUCTION else ""
+
+_pending = queue.Queue()
+# The running writer thread and the event that stops it; a fresh pair is
+# started by the next record() after stop()
+_writer: Optional[tuple] = None
+_writer_lock = threading.Lock()
+
+def record(user_id: int) -> None:
+    """Queue a last_login stamp for a user (written within FLUSH_INTERVAL)"""
+    _pending.put((user_id, datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")))
+    _ensure_started()
+
+def flush() -> int:
+    """Write all queued logins, keeping the latest per user; returns users written"""
+    latest = {}
+    while True:
+        try:
+            user_id, logged_in_at = _pending.get_nowait()
+        except queue.Empty:
+            break
+        latest[user_id] = logged_in_at
+
+    items = list(latest.items())
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        cases = " ".join(["WHEN ? THEN ?"] * len(batch))
+        placeholders = ",".join(["?"] * len(batch))
+        params = [value for item in batch for value in item]
+        params.extend(user_id for user_id, _ in batch)
+        execute_update(
+            f"UPDATE users SET last_login = (CASE id {cases} END){_TIMESTAMP_CAST} "
+            f"WHERE id IN ({placeholders})",
+            tuple(params)
+        )
+    return len(items)
+
+def stop() -> None:
+    """Stop the background writer and flush anything still queued"""
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        thread, stopped = writer
+        stopped.set()
+        thread.join()
+    flush()
+
+def _run(stopped: threading.Event) -> None:
+    while not stopped.wait(FLUSH_INTERVAL):
+        try:
+            flush()
+        except Exception:
+            logger.exception("Failed to write last_login updates")
+
+def _ensure_started() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            stopped = threading.Event()
+            thread = threading.Thread(
+                target=_run, args=(stopped,), name="last-login-writer", daemon=True
+            )
+            thread.start()
+            _writer = (thread, stopped)
+
+atexit.register(stop)
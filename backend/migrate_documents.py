@@ -2,12 +2,27 @@
 """
 Migration script to upgrade documents table to support three-tier document system
 """
-import sqlite3
 import os
 from database import DATABASE_PATH, get_db
 from models import (DOCUMENT_TEMPLATES_TABLE, DOCUMENT_REQUIREMENTS_TABLE, 
                     DOCUMENT_VERSIONS_TABLE)
 
+# Columns added to the original documents table. Existing rows become
+# ancillary documents, which is why library_type (unlike in the fresh schema)
+# carries a default
+NEW_DOCUMENT_COLUMNS = (
+    "library_type TEXT NOT NULL DEFAULT 'ancillary' "
+    "CHECK(library_type IN ('admin', 'core', 'ancillary'))",
+    "category TEXT",
+    "is_template INTEGER DEFAULT 0",
+    "is_required INTEGER DEFAULT 0",
+    "template_id INTEGER REFERENCES documents (id)",
+    "version INTEGER DEFAULT 1",
+    "status TEXT DEFAULT 'active' CHECK(status IN ('active', 'archived', 'deleted'))",
+    "description TEXT",
+    "tags TEXT",
+)
+
 def migrate_documents_table():
     """Migrate existing documents table to new schema"""
     
@@ -16,68 +31,26 @@ def migrate_documents_table():
         
         print("Starting documents table migration...")
         
+        # Run the whole migration as one write transaction (a single commit,
+        # and a failure part-way rolls everything back). IMMEDIATE takes the
+        # write lock up front; a running app may hold it briefly, so wait for it
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.execute("BEGIN IMMEDIATE")
+        
         # Check if migration already done
-        try:
-            cursor.execute("SELECT library_type FROM documents LIMIT 1")
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(documents)")}
+        if "library_type" in columns:
             print("Migration already completed - documents table has new columns")
             return
-        except sqlite3.OperationalError:
-            # Column doesn't exist, proceed with migration
-            pass
         
         try:
-            # Step 1: Create backup of existing data
-            print("Creating backup of existing documents...")
-            cursor.execute("""
-                CREATE TABLE documents_backup AS 
-                SELECT * FROM documents
-            """)
+            # Step 1: Add the new columns in place. Every new column is
+            # nullable or has a default, so no existing row has to be copied
+            print("Adding new columns to documents table...")
+            for column in NEW_DOCUMENT_COLUMNS:
+                cursor.execute(f"ALTER TABLE documents ADD COLUMN {column}")
             
-            # Step 2: Drop existing table
-            print("Dropping old documents table...")
-            cursor.execute("DROP TABLE documents")
-            
-            # Step 3: Create new documents table with enhanced schema
-            print("Creating new documents table...")
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    initiative_id INTEGER,
-                    filename TEXT NOT NULL,
-                    file_path TEXT NOT NULL,
-                    file_size INTEGER,
-                    uploaded_by TEXT,
-                    uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    document_type TEXT,
-                    library_type TEXT CHECK(library_type IN ('admin', 'core', 'ancillary')) NOT NULL,
-                    category TEXT,
-                    is_template INTEGER DEFAULT 0,
-                    is_required INTEGER DEFAULT 0,
-                    template_id INTEGER,
-                    version INTEGER DEFAULT 1,
-                    status TEXT DEFAULT 'active' CHECK(status IN ('active', 'archived', 'deleted')),
-                    description TEXT,
-                    tags TEXT,
-                    FOREIGN KEY (initiative_id) REFERENCES initiatives (id),
-                    FOREIGN KEY (template_id) REFERENCES documents (id)
-                )
-            """)
-            
-            # Step 4: Migrate existing data
-            print("Migrating existing data...")
-            cursor.execute("""
-                INSERT INTO documents (
-                    id, initiative_id, filename, file_path, file_size, 
-                    uploaded_by, uploaded_at, document_type, library_type
-                )
-                SELECT 
-                    id, initiative_id, filename, file_path, file_size,
-                    uploaded_by, uploaded_at, document_type, 
-                    'ancillary' as library_type
-                FROM documents_backup
-            """)
-            
-            # Step 5: Create new tables
+            # Step 2: Create new tables
             print("Creating document templates table...")
             cursor.execute(DOCUMENT_TEMPLATES_TABLE)
             
@@ -87,11 +60,28 @@ def migrate_documents_table():
             print("Creating document versions table...")
             cursor.execute(DOCUMENT_VERSIONS_TABLE)
             
-            # Step 6: Create indexes
+            # Step 3: Insert some sample document requirements
+            print("Inserting sample document requirements...")
+            sample_requirements = [
+                ("Business Case", "Business justification document", "business", "discovery", 1, None),
+                ("Technical Architecture", "Technical design and architecture", "technical", "design", 1, None),
+                ("Risk Assessment", "Risk analysis and mitigation plan", "compliance", "discovery", 1, None),
+                ("Implementation Plan", "Project implementation timeline", "project", "build", 1, None),
+                ("Go-Live Checklist", "Production readiness checklist", "deployment", "pilot", 1, None)
+            ]
+            
+            cursor.executemany("""
+                INSERT INTO document_requirements 
+                (name, description, category, stage, is_mandatory, template_id)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, sample_requirements)
+            
+            # Step 4: Create indexes once all rows are in, so each is built
+            # in a single pass rather than maintained row by row
             print("Creating indexes...")
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_documents_initiative 
-                ON documents(initiative_id)
+                CREATE INDEX IF NOT EXISTS idx_documents_initiative_uploaded 
+                ON documents(initiative_id, uploaded_at DESC)
             """)
             cursor.execute("""
                 CREATE INDEX IF NOT EXISTS idx_documents_library_type 
@@ -102,39 +92,22 @@ def migrate_documents_table():
                 ON documents(template_id)
             """)
             
-            # Step 7: Insert some sample document requirements
-            print("Inserting sample document requirements...")
-            sample_requirements = [
-                ("Business Case", "Business justification document", "business", "discovery", 1, None),
-                ("Technical Architecture", "Technical design and architecture", "technical", "design", 1, None),
-                ("Risk Assessment", "Risk analysis and mitigation plan", "compliance", "discovery", 1, None),
-                ("Implementation Plan", "Project implementation timeline", "project", "build", 1, None),
-                ("Go-Live Checklist", "Production readiness checklist", "deployment", "pilot", 1, None)
-            ]
-            
-            for req in sample_requirements:
-                cursor.execute("""
-                    INSERT INTO document_requirements 
-                    (name, description, category, stage, is_mandatory, template_id)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, req)
-            
-            # Step 8: Clean up backup table
-            print("Cleaning up...")
-            cursor.execute("DROP TABLE documents_backup")
-            
             conn.commit()
+            # Refresh planner statistics for the new columns and indexes,
+            # sampling rather than scanning every row of large tables
+            cursor.execute("PRAGMA analysis_limit=1000")
+            cursor.execute("ANALYZE")
+            # Fold the migration's WAL back into the database file
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
             print("Documents table migration completed successfully!")
             
             # Show migration results
-            cursor.execute("SELECT COUNT(*) FROM documents")
-            doc_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM document_templates")
-            template_count = cursor.fetchone()[0]
-            
-            cursor.execute("SELECT COUNT(*) FROM document_requirements")
-            req_count = cursor.fetchone()[0]
+            cursor.execute("""
+                SELECT (SELECT COUNT(*) FROM documents),
+                       (SELECT COUNT(*) FROM document_templates),
+                       (SELECT COUNT(*) FROM document_requirements)
+            """)
+            doc_count, template_count, req_count = cursor.fetchone()
             
             print(f"Migration summary:")
             print(f"  - Documents migrated: {doc_count}")
@@ -142,18 +115,9 @@ def migrate_documents_table():
             print(f"  - Document requirements: {req_count}")
             
         except Exception as e:
+            # get_db rolls the transaction back, leaving the table as it was
             print(f"Migration failed: {e}")
-            # Try to restore from backup if it exists
-            try:
-                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='documents_backup'")
-                if cursor.fetchone():
-                    print("Attempting to restore from backup...")
-                    cursor.execute("DROP TABLE IF EXISTS documents")
-                    cursor.execute("ALTER TABLE documents_backup RENAME TO documents")
-                    conn.commit()
-                    print("Restored from backup")
-            except Exception as restore_error:
-                print(f"Failed to restore from backup: {restore_error}")
+            print("Rolled back - the documents table is unchanged")
             raise
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Literal, Optional, List
+from pydantic import BaseModel, ConfigDict
 import os
 
 # Check if we're in production
@@ -230,13 +230,29 @@ else:
     )
     """
 
+# Columns of the initiatives table, used for explicit projections
+INITIATIVE_COLUMNS = (
+    "id", "name", "description", "department", "stage", "priority",
+    "lead_name", "lead_email", "business_value", "technical_approach",
+    "start_date", "end_date", "status", "created_at", "updated_at"
+)
+INITIATIVE_SELECT = ", ".join(INITIATIVE_COLUMNS)
+
+# Allowed values, mirroring the CHECK constraints above (Literal membership is
+# checked natively by pydantic-core rather than through a regex)
+Stage = Literal["discovery", "pilot", "production", "retired"]
+Priority = Literal["low", "medium", "high", "critical"]
+InitiativeStatus = Literal["active", "paused", "completed", "deleted"]
+LibraryType = Literal["admin", "core", "ancillary"]
+DocumentStatus = Literal["active", "archived", "deleted"]
+
 # Pydantic models for API
 class InitiativeBase(BaseModel):
     name: str
     description: Optional[str] = None
     department: Optional[str] = None
-    stage: Optional[str] = Field(None, pattern="^(discovery|pilot|production|retired)$")
-    priority: Optional[str] = Field(None, pattern="^(low|medium|high|critical)$")
+    stage: Optional[Stage] = None
+    priority: Optional[Priority] = None
     lead_name: Optional[str] = None
     lead_email: Optional[str] = None
     executive_champion: Optional[str] = None
@@ -250,7 +266,7 @@ class InitiativeBase(BaseModel):
     technical_approach: Optional[str] = None
     start_date: Optional[str] = None
     end_date: Optional[str] = None
-    status: Optional[str] = Field("active", pattern="^(active|paused|completed|deleted)$")
+    status: Optional[InitiativeStatus] = "active"
 
 class InitiativeCreate(InitiativeBase):
     pass
@@ -258,13 +274,24 @@ class InitiativeCreate(InitiativeBase):
 class InitiativeUpdate(InitiativeBase):
     name: Optional[str] = None
 
+class InitiativeDocumentSummary(BaseModel):
+    id: int
+    filename: str
+    library_type: Optional[str] = None
+    document_type: Optional[str] = None
+    file_size: Optional[int] = None
+    uploaded_at: Optional[datetime] = None
+
 class Initiative(InitiativeBase):
     id: int
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+class InitiativeWithDocuments(Initiative):
+    """An initiative as returned by the list endpoint's ?include=documents"""
+    documents: List[InitiativeDocumentSummary]
 
 class DocumentBase(BaseModel):
     initiative_id: Optional[int] = None
@@ -273,13 +300,13 @@ class DocumentBase(BaseModel):
     file_size: Optional[int] = None
     uploaded_by: Optional[str] = None
     document_type: Optional[str] = None
-    library_type: str = Field(..., pattern="^(admin|core|ancillary)$")
+    library_type: LibraryType
     category: Optional[str] = None
     is_template: bool = False
     is_required: bool = False
     template_id: Optional[int] = None
     version: int = 1
-    status: str = Field("active", pattern="^(active|archived|deleted)$")
+    status: DocumentStatus = "active"
     description: Optional[str] = None
     tags: Optional[str] = None
 
@@ -291,7 +318,7 @@ class DocumentUpdate(BaseModel):
     document_type: Optional[str] = None
     category: Optional[str] = None
     is_required: Optional[bool] = None
-    status: Optional[str] = Field(None, pattern="^(active|archived|deleted)$")
+    status: Optional[DocumentStatus] = None
     description: Optional[str] = None
     tags: Optional[str] = None
 
@@ -299,8 +326,7 @@ class Document(DocumentBase):
     id: int
     uploaded_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class DocumentTemplateBase(BaseModel):
     name: str
@@ -319,8 +345,7 @@ class DocumentTemplate(DocumentTemplateBase):
     created_at: datetime
     updated_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class DocumentRequirement(BaseModel):
     id: int
@@ -332,8 +357,7 @@ class DocumentRequirement(BaseModel):
     template_id: Optional[int] = None
     created_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class DocumentVersion(BaseModel):
     id: int
@@ -344,8 +368,7 @@ class DocumentVersion(BaseModel):
     uploaded_by: Optional[str] = None
     uploaded_at: datetime
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class ComplianceStatus(BaseModel):
     initiative_id: int
@@ -368,8 +391,7 @@ class User(UserBase):
     created_at: datetime
     last_login: Optional[datetime] = None
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True, frozen=True)
 
 class Token(BaseModel):
     access_token: str
@@ -406,5 +428,4 @@ class UserAPIKey(BaseModel):
     last_used: Optional[datetime] = None
     usage_count: int = 0
     
-    class Config:
-        from_attributes = True
\ No newline at end of file
+    model_config = ConfigDict(from_attributes=True, frozen=True)
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+SQL behind the API endpoints, built once and reused so the statement
+caches keep hitting
+"""
+import itertools
+from functools import lru_cache
+from typing import Optional
+from cachetools import TTLCache
+from database import aquery, INITIATIVE_DOCUMENTS_SQL
+from models import INITIATIVE_SELECT
+
+# Pre-built list_initiatives SQL keyed by which filters are present plus the
+# sort, so each combination is one fixed string the statement cache can reuse
+LIST_FILTER_COLUMNS = ("department", "stage", "priority", "status")
+LIST_SORT_COLUMNS = ("created_at", "updated_at", "priority", "name")
+
+def _build_list_initiatives_sql(mask: tuple, sort_by: str, sort_order: str,
+                                with_documents: bool) -> str:
+    columns = f"{INITIATIVE_SELECT}, {INITIATIVE_DOCUMENTS_SQL}" if with_documents else INITIATIVE_SELECT
+    query = f"SELECT {columns} FROM initiatives WHERE 1=1"
+    for column, present in zip(LIST_FILTER_COLUMNS, mask):
+        if present:
+            query += f" AND {column} = ?"
+    return query + f" ORDER BY {sort_by} {sort_order.upper()} LIMIT ? OFFSET ?"
+
+LIST_INITIATIVES_SQL = {
+    mask + (sort_by, sort_order, with_documents):
+        _build_list_initiatives_sql(mask, sort_by, sort_order, with_documents)
+    for mask in itertools.product((False, True), repeat=len(LIST_FILTER_COLUMNS))
+    for sort_by in LIST_SORT_COLUMNS
+    for sort_order in ("asc", "desc")
+    for with_documents in (False, True)
+}
+
+@lru_cache(maxsize=256)
+def update_initiative_sql(columns: frozenset) -> str:
+    """UPDATE statement for a set of columns, reused so the statement cache can hit"""
+    assignments = ", ".join(f"{column} = ?" for column in sorted(columns))
+    return (
+        f"UPDATE initiatives SET {assignments}, updated_at = CURRENT_TIMESTAMP "
+        f"WHERE id = ? RETURNING {INITIATIVE_SELECT}"
+    )
+
+# Only the fields format_initiatives_context puts in the prompt, under the
+# names it reads them by
+CHAT_CONTEXT_SQL = (
+    "SELECT name AS title, lead_name AS program_owner, department, stage, "
+    "description AS background, business_value AS goal "
+    "FROM initiatives WHERE id IN ({placeholders}) AND status != 'deleted'"
+)
+
+# Keyset pages of the CSV export, newest first. (created_at, id) is unique,
+# so no row is skipped or repeated at a page boundary
+EXPORT_INITIATIVES_SQL = (
+    f"SELECT {INITIATIVE_SELECT} FROM initiatives WHERE status != 'deleted' "
+    "ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+EXPORT_INITIATIVES_AFTER_SQL = (
+    f"SELECT {INITIATIVE_SELECT} FROM initiatives WHERE status != 'deleted' "
+    "AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+
+# Mandatory requirements per stage; these only change through migrations
+_stage_requirements_cache = TTLCache(maxsize=32, ttl=300)
+
+async def get_stage_requirements(stage: Optional[str]):
+    """Mandatory document requirements that apply to a stage"""
+    requirements = _stage_requirements_cache.get(stage)
+    if requirements is None:
+        rows = await aquery(
+            """SELECT dr.id, dr.name, dr.description, dr.category, dr.template_id,
+                      dt.file_path as template_path
+               FROM document_requirements dr
+               LEFT JOIN document_templates dt ON dr.template_id = dt.id
+               WHERE dr.is_mandatory = 1 AND (dr.stage = ? OR dr.stage IS NULL)
+               ORDER BY dr.name""",
+            (stage,)
+        )
+        requirements = _stage_requirements_cache[stage] = [dict(row) for row in rows]
+    return requirements
+
+async def get_uploaded_required(initiative_id: int):
+    """Count and distinct types of an initiative's active required core documents"""
+    # Grouped in SQL so only one row per document type comes back
+    rows = await aquery(
+        """SELECT document_type, COUNT(*) AS uploaded FROM documents
+           WHERE initiative_id = ? AND library_type = 'core'
+           AND is_required = 1 AND status = 'active'
+           GROUP BY document_type""",
+        (initiative_id,)
+    )
+    return (
+        sum(row["uploaded"] for row in rows),
+        frozenset(row["document_type"] for row in rows if row["document_type"])
+    )
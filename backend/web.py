@@ -0,0 +1,71 @@
+"""
+HTTP plumbing for the API: process lifespan, response classes, upload
+streaming and SPA static file serving
+"""
+import asyncio
+import os
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import ORJSONResponse
+from fastapi.staticfiles import StaticFiles
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from database import init_pool, close_pool
+import last_login_queue
+from chat import close_chat_client
+
+MAX_FILE_SIZE = 50 * 1024 * 1024  # 50MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+# Paths the SPA fallback must never answer with index.html
+RESERVED_PREFIXES = ("api/", "docs", "health")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Hold pooled (WAL-mode) database connections for the life of the process"""
+    init_pool()
+    try:
+        yield
+    finally:
+        await close_chat_client()
+        await asyncio.to_thread(last_login_queue.stop)
+        close_pool()
+
+class RowsResponse(ORJSONResponse):
+    """Serialize database rows straight to JSON, skipping jsonable_encoder"""
+
+    def render(self, content) -> bytes:
+        # sqlite3.Row isn't natively supported, so orjson hands it to dict()
+        return orjson.dumps(content, default=dict, option=orjson.OPT_NON_STR_KEYS)
+
+async def stream_upload(file: UploadFile, dest: str, max_size: int = MAX_FILE_SIZE) -> int:
+    """Stream an upload to dest in chunks, enforcing the size limit as we go"""
+    size = 0
+    # Disk I/O goes to the threadpool so the event loop stays free
+    f = await run_in_threadpool(open, dest, "wb")
+    try:
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail="File too large")
+                await run_in_threadpool(f.write, chunk)
+        finally:
+            await run_in_threadpool(f.close)
+    except BaseException:
+        # Never leave a partial file behind (too large, disconnect, disk error)
+        os.remove(dest)
+        raise
+    return size
+
+class SPAStaticFiles(StaticFiles):
+    """Static files that fall back to index.html for React Router paths"""
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except StarletteHTTPException as exc:
+            if exc.status_code != 404 or path.startswith(RESERVED_PREFIXES):
+                raise
+            return await super().get_response("index.html", scope)
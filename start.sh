@@ -1,10 +1,12 @@
 #!/bin/bash
 
 # Start script for Railway deployment
-cd /app/backend
+cd "$(dirname "$0")/backend"
 
 # Initialize database if needed (PostgreSQL in production)
 python init_db.py || echo "Database initialization skipped (may already exist)"
 
 # Start the application
-exec uvicorn app:app --host 0.0.0.0 --port ${PORT:-8000}
\ No newline at end of file
+# Requests beyond MAX_CONCURRENT_REQUESTS in flight get a 503 instead of queueing
+exec uvicorn app:app --host 0.0.0.0 --port ${PORT:-8000} \
+    --limit-concurrency ${MAX_CONCURRENT_REQUESTS:-200}
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+from cryptography.fernet import Fernet
+
+# The backend modules import each other as top-level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "backend"))
+
+# Unit tests always run against SQLite, with cheap hashes for the seeded
+# users and a throwaway key so no development key file is written
+os.environ.pop("DATABASE_URL", None)
+os.environ["BCRYPT_ROUNDS"] = "5"
+os.environ["CHAT_ENCRYPTION_KEY"] = Fernet.generate_key().decode()
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """A freshly seeded SQLite database in a temporary directory"""
+    import database
+    import init_db
+    database_path = str(tmp_path / "database.db")
+    database.close_pool()
+    monkeypatch.setattr(database, "DATABASE_PATH", database_path)
+    monkeypatch.setattr(init_db, "DATABASE_PATH", database_path)
+    init_db.init_database()
+    yield database_path
+    database.close_pool()
+
+@pytest.fixture
+def client(db):
+    """A TestClient for the app, logged in as the seeded admin"""
+    from fastapi.testclient import TestClient
+    from app import app
+    with TestClient(app) as client:
+        response = client.post("/api/auth/login", data={"username": "admin", "password": "admin123"})
+        client.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+        yield client
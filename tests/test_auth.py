@@ -0,0 +1,51 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+import jwt
+import pytest
+from cachetools import TLRUCache
+from fastapi import HTTPException
+from passlib.hash import bcrypt
+import auth
+from auth import (
+    BCRYPT_ROUNDS, create_access_token, get_current_user, pwd_context
+)
+
+def test_bcrypt_cost_never_lowered():
+    """Only hashes below BCRYPT_ROUNDS are flagged for rehashing on login"""
+    lower = bcrypt.using(rounds=BCRYPT_ROUNDS - 1).hash("secret")
+    current = pwd_context.hash("secret")
+    higher = bcrypt.using(rounds=BCRYPT_ROUNDS + 1).hash("secret")
+    assert pwd_context.needs_update(lower)
+    assert not pwd_context.needs_update(current)
+    assert not pwd_context.needs_update(higher)
+
+def test_verified_token_cached_until_exp(db, monkeypatch):
+    """A verified token is cached, and stops being served once its exp passes"""
+    clock = [time.time()]
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime.fromtimestamp(clock[0], tz)
+
+    # Drive both the cache's and PyJWT's idea of "now" from the same clock
+    monkeypatch.setattr(auth, "_token_cache", TLRUCache(
+        maxsize=16, ttu=auth._token_cache.ttu, timer=lambda: clock[0]
+    ))
+    monkeypatch.setattr(jwt.api_jwt, "datetime", FrozenDatetime)
+
+    token = create_access_token({"sub": "admin", "role": "admin"}, timedelta(minutes=5))
+    user = asyncio.run(get_current_user(token))
+    assert user["username"] == "admin"
+    [(username, exp)] = auth._token_cache.values()
+    assert username == "admin"
+
+    clock[0] = exp - 1
+    assert asyncio.run(get_current_user(token))["username"] == "admin"
+
+    clock[0] = exp + 1
+    assert len(auth._token_cache) == 0
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(get_current_user(token))
+    assert exc_info.value.status_code == 401
@@ -0,0 +1,81 @@
+import pytest
+from cryptography.exceptions import InvalidTag
+import app as app_module
+import chat
+from chat import GCM_PREFIX, decrypt_api_key, encrypt_api_key, get_fernet, get_user_api_key
+from database import execute_insert, execute_one, execute_query
+
+def test_encrypt_round_trip():
+    """Keys are stored as v2 AES-GCM ciphertexts with a fresh nonce each time"""
+    first = encrypt_api_key("sk-ant-test")
+    second = encrypt_api_key("sk-ant-test")
+    assert first.startswith(GCM_PREFIX)
+    assert first != second
+    assert decrypt_api_key(first) == decrypt_api_key(second) == "sk-ant-test"
+
+def test_tampered_ciphertext_rejected():
+    """AES-GCM refuses a ciphertext that was modified in storage"""
+    encrypted = encrypt_api_key("sk-ant-test")
+    tampered = encrypted[:-2] + ("AA" if encrypted[-2:] != "AA" else "BB")
+    with pytest.raises(InvalidTag):
+        decrypt_api_key(tampered)
+
+def test_fernet_fallback():
+    """Keys stored before AES-GCM are still readable"""
+    legacy = get_fernet().encrypt(b"sk-ant-legacy").decode()
+    assert decrypt_api_key(legacy) == "sk-ant-legacy"
+
+def test_legacy_key_reencrypted_on_read(db):
+    """Reading a Fernet-encrypted key rewrites it as AES-GCM"""
+    legacy = get_fernet().encrypt(b"sk-ant-legacy").decode()
+    execute_insert(
+        "INSERT INTO user_api_keys (user_id, encrypted_claude_key) VALUES (?, ?)",
+        ("admin", legacy)
+    )
+
+    assert get_user_api_key("admin") == "sk-ant-legacy"
+    stored = execute_one(
+        "SELECT encrypted_claude_key FROM user_api_keys WHERE user_id = ?", ("admin",)
+    )["encrypted_claude_key"]
+    assert stored.startswith(GCM_PREFIX)
+    assert get_user_api_key("admin") == "sk-ant-legacy"
+
+def test_reencrypt_keeps_newer_key(db, monkeypatch):
+    """A key stored after the legacy value was read is not overwritten"""
+    legacy = get_fernet().encrypt(b"sk-ant-legacy").decode()
+    execute_insert(
+        "INSERT INTO user_api_keys (user_id, encrypted_claude_key) VALUES (?, ?)",
+        ("admin", encrypt_api_key("sk-ant-new"))
+    )
+    # Simulate reading the row just before the new key replaced it
+    monkeypatch.setattr(chat, "execute_one", lambda query, params: {"encrypted_claude_key": legacy})
+    assert get_user_api_key("admin") == "sk-ant-legacy"
+
+    monkeypatch.setattr(chat, "execute_one", execute_one)
+    assert get_user_api_key("admin") == "sk-ant-new"
+
+def test_missing_key(db):
+    """Users without a stored key get None"""
+    assert get_user_api_key("reviewer") is None
+
+def test_chat_notes_dropped_initiatives(client, monkeypatch):
+    """Initiatives past MAX_CTX_INITIATIVES are left out, and the reply says so"""
+    sent = {}
+    async def fake_process_chat_query(user_id, query, initiatives, api_key):
+        sent["initiatives"] = initiatives
+        return {"response": "answer"}
+    monkeypatch.setattr(app_module, "process_chat_query", fake_process_chat_query)
+
+    ids = [row["id"] for row in execute_query("SELECT id FROM initiatives")]
+    response = client.post("/api/chat", json={"query": "q", "initiative_ids": ids})
+    assert response.json() == {"response": "answer"}
+    assert {init["title"] for init in sent["initiatives"]} == {
+        row["name"] for row in execute_query("SELECT name FROM initiatives")
+    }
+
+    monkeypatch.setattr(app_module, "MAX_CTX_INITIATIVES", 2)
+    response = client.post("/api/chat", json={"query": "q", "initiative_ids": ids})
+    assert len(sent["initiatives"]) == 2
+    assert response.json()["response"] == (
+        "Note: only the first 2 of the 3 selected initiatives were used as context.\n\nanswer"
+    )
@@ -0,0 +1,23 @@
+from database import in_clause_query, IN_CLAUSE_PAD
+
+TEMPLATE = "SELECT * FROM initiatives WHERE id IN ({placeholders})"
+
+def test_in_clause_query_pads_to_power_of_two():
+    """Values are padded with IN_CLAUSE_PAD up to the next power of two"""
+    query, params = in_clause_query(TEMPLATE, [7, 8, 9])
+    assert query == "SELECT * FROM initiatives WHERE id IN (?,?,?,?)"
+    assert params == (7, 8, 9, IN_CLAUSE_PAD)
+
+    query, params = in_clause_query(TEMPLATE, [1, 2, 3, 4])
+    assert query.endswith("IN (?,?,?,?)")
+    assert params == (1, 2, 3, 4)
+
+    query, params = in_clause_query(TEMPLATE, [])
+    assert query.endswith("IN (?)")
+    assert params == (IN_CLAUSE_PAD,)
+
+def test_in_clause_query_reuses_sql_per_bucket():
+    """Every list size within a bucket maps to the same SQL string"""
+    queries = {in_clause_query(TEMPLATE, list(range(size)))[0] for size in range(5, 9)}
+    assert len(queries) == 1
+    assert in_clause_query(TEMPLATE, list(range(9)))[0] not in queries
@@ -0,0 +1,57 @@
+import csv
+import io
+import app as app_module
+from database import execute_insert, execute_one
+
+def test_list_without_documents(client):
+    """The plain list has no documents key"""
+    initiatives = client.get("/api/initiatives").json()
+    assert len(initiatives) == 3
+    assert all("documents" not in initiative for initiative in initiatives)
+
+def test_list_include_documents(client):
+    """?include=documents embeds each initiative's active documents"""
+    initiative_id = execute_one("SELECT id FROM initiatives ORDER BY id LIMIT 1")["id"]
+    for filename, status in (("charter.pdf", "active"), ("old.pdf", "deleted")):
+        execute_insert(
+            """INSERT INTO documents (initiative_id, filename, file_path, file_size,
+                                      library_type, document_type, status)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (initiative_id, filename, f"core/{filename}", 1024, "core", "charter", status)
+        )
+
+    initiatives = client.get("/api/initiatives", params={"include": "documents"}).json()
+    documents = {initiative["id"]: initiative["documents"] for initiative in initiatives}
+    assert [doc["filename"] for doc in documents.pop(initiative_id)] == ["charter.pdf"]
+    assert all(docs == [] for docs in documents.values())
+
+    document = next(i for i in initiatives if i["id"] == initiative_id)["documents"][0]
+    assert set(document) == {
+        "id", "filename", "library_type", "document_type", "file_size", "uploaded_at"
+    }
+    assert (document["library_type"], document["file_size"]) == ("core", 1024)
+
+def test_include_rejects_unknown_values(client):
+    """Only documents can be included"""
+    assert client.get("/api/initiatives", params={"include": "owners"}).status_code == 422
+
+def test_export_csv_pages_by_key(client, monkeypatch):
+    """The CSV export pages through every live initiative exactly once"""
+    monkeypatch.setattr(app_module, "CSV_EXPORT_BATCH_ROWS", 2)
+    for name, status in (("Tied A", "active"), ("Tied B", "active"), ("Gone", "deleted")):
+        execute_insert(
+            "INSERT INTO initiatives (name, department, stage, status) VALUES (?, ?, ?, ?)",
+            (name, "IT", "discovery", status)
+        )
+
+    response = client.get("/api/export/csv")
+    assert response.status_code == 200
+    header, *rows = csv.reader(io.StringIO(response.text))
+    assert header[:2] == ["id", "name"]
+    live = execute_one(
+        "SELECT COUNT(*) AS n FROM initiatives WHERE status != 'deleted'"
+    )["n"]
+    ids = [int(row[0]) for row in rows]
+    assert len(ids) == live == 5
+    assert len(set(ids)) == live
+    assert "Gone" not in {row[1] for row in rows}
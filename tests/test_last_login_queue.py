@@ -0,0 +1,48 @@
+import last_login_queue
+from database import execute_query
+
+def last_logins():
+    return {row["username"]: row["last_login"] for row in execute_query(
+        "SELECT username, last_login FROM users"
+    )}
+
+def test_flush_keeps_latest_login_per_user(db, monkeypatch):
+    """Repeated logins collapse to one UPDATE row per user, latest stamp wins"""
+    monkeypatch.setattr(last_login_queue, "_ensure_started", lambda: None)
+    users = {row["username"]: row["id"] for row in execute_query("SELECT id, username FROM users")}
+    last_login_queue._pending.put((users["admin"], "2024-01-01 09:00:00"))
+    last_login_queue._pending.put((users["admin"], "2024-01-02 09:00:00"))
+    last_login_queue._pending.put((users["reviewer"], "2024-01-03 09:00:00"))
+
+    assert last_login_queue.flush() == 2
+    assert last_logins() == {
+        "admin": "2024-01-02 09:00:00",
+        "reviewer": "2024-01-03 09:00:00",
+        "contributor": None,
+    }
+    assert last_login_queue.flush() == 0
+
+def test_flush_splits_large_batches(db, monkeypatch):
+    """Users beyond FLUSH_BATCH_SIZE go out in further statements"""
+    monkeypatch.setattr(last_login_queue, "_ensure_started", lambda: None)
+    monkeypatch.setattr(last_login_queue, "FLUSH_BATCH_SIZE", 2)
+    for row in execute_query("SELECT id FROM users"):
+        last_login_queue.record(row["id"])
+
+    assert last_login_queue.flush() == 3
+    assert all(last_logins().values())
+
+def test_record_restarts_writer_after_stop(db, monkeypatch):
+    """stop() doesn't disable the writer for good; the next record() restarts it"""
+    monkeypatch.setattr(last_login_queue, "FLUSH_INTERVAL", 0.01)
+    admin_id = execute_query("SELECT id FROM users WHERE username = 'admin'")[0]["id"]
+    last_login_queue.record(admin_id)
+    last_login_queue.stop()
+    assert last_login_queue._writer is None
+    assert last_logins()["admin"]
+
+    last_login_queue.record(admin_id)
+    thread, _stopped = last_login_queue._writer
+    assert thread.is_alive()
+    last_login_queue.stop()
+    assert not thread.is_alive()
@@ -0,0 +1,41 @@
+import asyncio
+import io
+import pytest
+from fastapi import HTTPException, UploadFile
+import web
+
+class FailingFile(io.BytesIO):
+    """A stream whose second read fails, like a client that disconnects"""
+
+    def __init__(self):
+        super().__init__(b"x" * 10)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        if self.reads > 1:
+            raise OSError("connection lost")
+        return super().read(size)
+
+def test_stream_upload_writes_file(tmp_path):
+    """The whole upload lands at dest and its size is returned"""
+    dest = tmp_path / "upload.bin"
+    size = asyncio.run(web.stream_upload(UploadFile(io.BytesIO(b"hello")), str(dest)))
+    assert size == 5
+    assert dest.read_bytes() == b"hello"
+
+def test_stream_upload_removes_oversized_file(tmp_path):
+    """Going over max_size is a 413 and leaves no file behind"""
+    dest = tmp_path / "upload.bin"
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(web.stream_upload(UploadFile(io.BytesIO(b"x" * 10)), str(dest), max_size=4))
+    assert exc_info.value.status_code == 413
+    assert not dest.exists()
+
+def test_stream_upload_removes_partial_file(tmp_path, monkeypatch):
+    """A read that fails midway leaves no partial file behind"""
+    monkeypatch.setattr(web, "UPLOAD_CHUNK_SIZE", 4)
+    dest = tmp_path / "upload.bin"
+    with pytest.raises(OSError):
+        asyncio.run(web.stream_upload(UploadFile(FailingFile()), str(dest)))
+    assert not dest.exists()